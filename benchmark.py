@@ -0,0 +1,191 @@
+"""Benchmarks for the operations of NumPy: the absolute basics for beginners"""
+
+import argparse
+import json
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Every operation family exercised by `main.py`, applied to a 2D input array `a`.
+OPERATIONS = {
+    "zeros": lambda a: np.zeros(a.shape, dtype=a.dtype),
+    "empty": lambda a: np.empty(a.shape, dtype=a.dtype),
+    "arange": lambda a: np.arange(a.size, dtype=a.dtype),
+    "sort": lambda a: np.sort(a, axis=None),
+    "concatenate": lambda a: np.concatenate((a, a)),
+    "newaxis": lambda a: a.reshape(-1)[:, np.newaxis],
+    "expand_dims": lambda a: np.expand_dims(a, axis=1),
+    "boolean_indexing": lambda a: a[(a > 2) & (a < 11)],
+    "nonzero": lambda a: np.nonzero(a < 5),
+    "vstack": lambda a: np.vstack((a, a)),
+    "hstack": lambda a: np.hstack((a, a)),
+    "sum": lambda a: a.sum(),
+    "min_axis_0": lambda a: a.min(axis=0),
+    "max_axis_1": lambda a: a.max(axis=1),
+    "broadcasting": lambda a: a * 1.6 + a[0],
+    "unique": lambda a: np.unique(a, return_index=True, return_counts=True),
+    "csv": lambda a: _csv_round_trip(a),
+}
+
+LAYOUTS = ("C", "F", "strided")
+
+
+def _csv_round_trip(a):
+    with tempfile.TemporaryFile("w+") as f:
+        np.savetxt(f, a, fmt="%d" if a.dtype.kind in "iu" else "%.18e", delimiter=",")
+        f.seek(0)
+        return np.loadtxt(f, delimiter=",", dtype=a.dtype)
+
+
+def make_array(size, dtype, layout):
+    """Create a roughly square 2D array with `size` elements in the given layout.
+
+    The values are generated in `dtype` and the layout directly, so that no temporary
+    copy raises the peak memory of the process.
+    """
+    cols = max(1, int(np.sqrt(size)))
+    rows = size // cols
+    rng = np.random.default_rng(0)
+    width = 2 * cols if layout == "strided" else cols
+    # The transpose of a C-ordered array is in Fortran order.
+    shape = (width, rows) if layout == "F" else (rows, width)
+    dtype = np.dtype(dtype)
+    if dtype.kind in "iu":
+        a = rng.integers(0, 16, size=shape, dtype=dtype)
+    elif dtype in (np.float32, np.float64):
+        a = rng.random(shape, dtype=dtype)
+        a *= 16
+    else:
+        a = (rng.random(shape) * 16).astype(dtype)
+    if layout == "F":
+        return a.T
+    if layout == "strided":
+        return a[:, ::2]
+    return a
+
+
+def _peak_rss():
+    # `ru_maxrss` is reported in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _time(func, a, loops):
+    start = time.perf_counter()
+    for _ in range(loops):
+        func(a)
+    return time.perf_counter() - start
+
+
+def run_case(operation, size, dtype, layout, repeat, min_time):
+    """Time one operation on one input, in a process of its own.
+
+    Every sample runs the operation as many times as it takes to last at least
+    `min_time` seconds, so that fast operations on small inputs aren't lost in the
+    resolution of the clock and the noise of a single call.
+    """
+    func = OPERATIONS[operation]
+    a = make_array(size, dtype, layout)
+    setup_rss = _peak_rss()
+    # The first call warms up caches and lazily initialized parts of NumPy. After that,
+    # the number of calls per sample is doubled until a sample lasts long enough.
+    func(a)
+    loops = 1
+    while _time(func, a, loops) < min_time:
+        loops *= 2
+    times = [_time(func, a, loops) / loops for _ in range(repeat)]
+    p50, p90, p99 = np.percentile(times, [50, 90, 99])
+    return {
+        "operation": operation,
+        "size": size,
+        "elements": a.size,
+        "dtype": dtype,
+        "layout": layout,
+        "p50": p50,
+        "p90": p90,
+        "p99": p99,
+        "loops": loops,
+        "throughput": a.nbytes / p50 if p50 else float("inf"),
+        "peak_rss": _peak_rss(),
+        # How far the operation raised the peak above the input and the interpreter.
+        "operation_rss": _peak_rss() - setup_rss,
+    }
+
+
+def load_baseline(path):
+    """Read the results of an earlier run, keyed by case."""
+    with open(path, encoding="utf-8") as f:
+        return {
+            (r["operation"], r["size"], r["dtype"], r["layout"]): r
+            for r in map(json.loads, f)
+        }
+
+
+def compare(results, baseline, threshold):
+    """Return the results whose median latency regressed against a baseline."""
+    regressions = []
+    for result in results:
+        key = (result["operation"], result["size"], result["dtype"], result["layout"])
+        if key in baseline and result["p50"] > baseline[key]["p50"] * (1 + threshold):
+            regressions.append((result, baseline[key]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--operations", nargs="+", default=list(OPERATIONS))
+    parser.add_argument("--sizes", nargs="+", type=float, default=[1e3, 1e4, 1e5, 1e6])
+    parser.add_argument("--dtypes", nargs="+", default=["int64", "float64"])
+    parser.add_argument("--layouts", nargs="+", default=list(LAYOUTS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.01)
+    parser.add_argument("--output", default="benchmark.jsonl")
+    parser.add_argument("--compare", metavar="BASELINE")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    # The baseline is read before anything runs, since `--output` may overwrite it.
+    baseline = None
+    if args.compare:
+        if not os.path.exists(args.compare):
+            parser.error(f"baseline {args.compare} does not exist")
+        baseline = load_baseline(args.compare)
+
+    cases = [
+        (operation, int(size), dtype, layout, args.repeat, args.min_time)
+        for operation in args.operations
+        for size in args.sizes
+        for dtype in args.dtypes
+        for layout in args.layouts
+    ]
+    # A fresh process per case keeps the peak RSS of one case from leaking into the
+    # next one.
+    results = []
+    with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as pool:
+        for result in pool.map(run_case, *zip(*cases)):
+            print(
+                f"{result['operation']:>16} {result['size']:>12} {result['dtype']:>8} "
+                f"{result['layout']:>8} {result['p50'] * 1e3:10.3f} ms "
+                f"{result['throughput'] / 1e9:8.3f} GB/s"
+            )
+            results.append(result)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(result) + "\n" for result in results)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for result, base in regressions:
+            print(
+                f"regression: {result['operation']} {result['size']} {result['dtype']} "
+                f"{result['layout']}: {base['p50'] * 1e3:.3f} ms -> "
+                f"{result['p50'] * 1e3:.3f} ms"
+            )
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,555 +1,2439 @@
-"""NumPy: the absolute basics for beginners"""
+"""NumPy: the absolute basics for beginners
 
+Every section of the tutorial is a function that can be run on its own, from the command
+line or after importing this module.
+"""
+
+import argparse
+import ast
+import inspect
+import io
+import json
 import math
+import os
+import pickle
+import sys
+import tracemalloc
+from collections import OrderedDict
+
 import numpy as np
-import pandas as pd
+
+# Every section below is run after `section()`, which prints its title and, if profiling
+# is enabled, measures the section as a span (see `profiling.py`).
+from profiling import section
 
 ########################################################################################
 # NumPy: the absolute basics for beginners                                             #
 ########################################################################################
-print("NumPy: the absolute basics for beginners")
+
+# This script is also run as a short-lived command, many times over, so it should start
+# quickly. The modules that only some sections use are therefore imported when one of
+# their attributes is first used, rather than at the top. Pandas alone takes longer to
+# import than NumPy and all other modules together. Run `python main.py --import-times`
+# to see how long every import takes.
+
+
+class LazyModule:
+    """A module that is only imported once one of its attributes is used."""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        # Unlike `importlib.import_module()`, `__import__()` shows up in the output of
+        # `python -X importtime`.
+        __import__(self._name)
+        return getattr(sys.modules[self._name], attr)
+
+
+bz2 = LazyModule("bz2")
+futures = LazyModule("concurrent.futures")
+gzip = LazyModule("gzip")
+hashlib = LazyModule("hashlib")
+lzma = LazyModule("lzma")
+pathlib = LazyModule("pathlib")
+pd = LazyModule("pandas")
+shared_memory = LazyModule("multiprocessing.shared_memory")
+subprocess = LazyModule("subprocess")
+tempfile = LazyModule("tempfile")
+
+# Every section is a function registered with `register()`, in the order of the
+# tutorial. A section that uses arrays from earlier sections lists those in `needs`, so
+# they run first when it is run on its own. The sections that use Pandas are marked, so
+# that they can be left out.
+SECTIONS = {}
+
+
+def register(title, needs=(), pandas=False):
+    """Register the decorated function as the section with the given title."""
+
+    def decorator(func):
+        SECTIONS[func.__name__] = (title, func, needs, pandas)
+        return func
+
+    return decorator
+
 
 ########################################################################################
 # Reading the example code                                                             #
 ########################################################################################
-print("\nReading the example code\n")
 
-a_0 = np.array([[1, 2, 3], [4, 5, 6]])
-print(a_0.shape)  # (2, 3)
+
+@register("Reading the example code")
+def reading_the_example_code():
+    a_0 = np.array([[1, 2, 3], [4, 5, 6]])
+    print(a_0.shape)  # (2, 3)
+
 
 ########################################################################################
 # Array fundamentals                                                                   #
 ########################################################################################
-print("\nArray fundamentals\n")
 
-# One way to initialize an array is using a Python sequence, such as a list.
-a_1 = np.array([1, 2, 3, 4, 5, 6])
-print(a_1)  # [1 2 3 4 5 6]
 
-# We can access an individual element of this array as we would access an element in the
-# original list: using the integer index of the element within square brackets.
-print(a_1[0])  # 1
+@register("Array fundamentals")
+def array_fundamentals():
+    global a_2  # pylint: disable=global-statement
+    # One way to initialize an array is using a Python sequence, such as a list.
+    a_1 = np.array([1, 2, 3, 4, 5, 6])
+    print(a_1)  # [1 2 3 4 5 6]
 
-# Like the original list, the array is mutable.
-a_1[0] = 10
-print(a_1)  # [10  2  3  4  5  6]
+    # We can access an individual element of this array as we would access an element in
+    # the original list: using the integer index of the element within square brackets.
+    print(a_1[0])  # 1
 
-# Also like the original list, Python slice notation can be used for indexing.
-print(a_1[:3])  # [10  2  3]
+    # Like the original list, the array is mutable.
+    a_1[0] = 10
+    print(a_1)  # [10  2  3  4  5  6]
 
-# One major difference is that slice indexing of a list copies the elements into a new
-# list, but slicing an array returns a view: an object that refers to the data in the
-# original array. The original array can be mutated using the view.
-b_0 = a_1[3:]
-print(b_0)  # [4 5 6]
-b_0[0] = 40
-print(a_1)  # [10  2  3 40  5  6]
+    # Also like the original list, Python slice notation can be used for indexing.
+    print(a_1[:3])  # [10  2  3]
 
-# Two- and higher-dimensional arrays can be initialized from nested Python sequences.
-a_2 = np.array([[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12]])
-print(a_2)
-# [[ 1  2  3  4]
-#  [ 5  6  7  8]
-#  [ 9 10 11 12]]
+    # One major difference is that slice indexing of a list copies the elements into a
+    # new list, but slicing an array returns a view: an object that refers to the data
+    # in the original array. The original array can be mutated using the view.
+    b_0 = a_1[3:]
+    print(b_0)  # [4 5 6]
+    b_0[0] = 40
+    print(a_1)  # [10  2  3 40  5  6]
+
+    # Two- and higher-dimensional arrays can be initialized from nested Python
+    # sequences.
+    a_2 = np.array([[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12]])
+    print(a_2)
+    # [[ 1  2  3  4]
+    #  [ 5  6  7  8]
+    #  [ 9 10 11 12]]
+
+    # Another difference between an array and a list of lists is that an element of the
+    # array can be accessed by specifying the index along each axis within a single set
+    # of square brackets, separated by commas.
+    print(a_2[1, 3])  # 8
 
-# Another difference between an array and a list of lists is that an element of the
-# array can be accessed by specifying the index along each axis within a single set of
-# square brackets, separated by commas.
-print(a_2[1, 3])  # 8
 
 ########################################################################################
 # Array attributes                                                                     #
 ########################################################################################
-print("\nArray attributes\n")
 
-# The number of dimensions of an array is contained in the `ndim` attribute.
-print(a_2.ndim)  # 2
 
-# The `shape` of an array is a tuple of non-negative integers that specify the number of
-# elements along each dimension.
-print(a_2.shape)  # (3, 4)
-print(a_2.ndim == len(a_2.shape))  # True
+@register("Array attributes", needs=[array_fundamentals])
+def array_attributes():
+    # The number of dimensions of an array is contained in the `ndim` attribute.
+    print(a_2.ndim)  # 2
+
+    # The `shape` of an array is a tuple of non-negative integers that specify the
+    # number of elements along each dimension.
+    print(a_2.shape)  # (3, 4)
+    print(a_2.ndim == len(a_2.shape))  # True
 
-# The fixed, total number of elements in array is contained in the `size` attribute.
-print(a_2.size)  # 12
-print(a_2.size == math.prod(a_2.shape))  # True
+    # The fixed, total number of elements in array is contained in the `size` attribute.
+    print(a_2.size)  # 12
+    print(a_2.size == math.prod(a_2.shape))  # True
+
+    # Arrays are typically "homogeneous", meaning that they contain elements of only one
+    # "data type". The data type is recorded in the `dtype` attribute.
+    print(a_2.dtype)  # int64
 
-# Arrays are typically "homogeneous", meaning that they contain elements of only one
-# "data type". The data type is recorded in the `dtype` attribute.
-print(a_2.dtype)  # int64
 
 ########################################################################################
 # How to create a basic array                                                          #
 ########################################################################################
-print("\nHow to create a basic array\n")
 
-# Besides creating an array from a sequence of elements, you can easily create an array
-# filled with `0`'s:
-print(np.zeros(2))  # [0. 0.]
 
-# Or an array filled with `1`'s:
-print(np.ones(2))  # [1. 1.]
+@register("How to create a basic array")
+def creating_a_basic_array():
+    # Besides creating an array from a sequence of elements, you can easily create an
+    # array filled with `0`'s:
+    print(np.zeros(2))  # [0. 0.]
+
+    # Or an array filled with `1`'s:
+    print(np.ones(2))  # [1. 1.]
+
+    # Or even an empty array! The function `empty` creates an array whose initial
+    # content is random. The reason to use `empty` over `zeros` is speed.
+    print(np.empty(2))  # [3.14, 42.]
 
-# Or even an empty array! The function `empty` creates an array whose initial content is
-# random. The reason to use `empty` over `zeros` is speed.
-print(np.empty(2))  # [3.14, 42.]
+    # You can create an array with a range of elements:
+    print(np.arange(4))  # [0 1 2 3]
 
-# You can create an array with a range of elements:
-print(np.arange(4))  # [0 1 2 3]
+    # While the default data type is floating point (`np.float64`), you can explicitly
+    # specify which data type you want using the `dtype` keyword.
+    print(np.ones(2, dtype=np.int64))  # [1 1]
 
-# While the default data type is floating point (`np.float64`), you can explicitly
-# specify which data type you want using the `dtype` keyword.
-print(np.ones(2, dtype=np.int64))  # [1 1]
 
 ########################################################################################
 # Adding, removing, and sorting elements                                               #
 ########################################################################################
-print("\nAdding, removing, and sorting elements\n")
 
-# You can quickly sort the numbers in ascending order with:
-print(np.sort(np.array([2, 1, 5, 3, 7, 4, 6, 8])))
 
-# You can concatenate arrays with `np.concatenate()`.
-a_3 = np.array([1, 2, 3, 4])
-b_1 = np.array([5, 6, 7, 8])
-print(np.concatenate((a_3, b_0)))
+@register("Adding, removing, and sorting elements")
+def adding_removing_and_sorting():
+    # You can quickly sort the numbers in ascending order with:
+    print(np.sort(np.array([2, 1, 5, 3, 7, 4, 6, 8])))
 
-x_0 = np.array([[1, 2], [3, 4]])
-print(x_0.ndim)  # 2
-print(x_0.shape)  # (2, 2)
+    # You can concatenate arrays with `np.concatenate()`.
+    a_3 = np.array([1, 2, 3, 4])
+    b_1 = np.array([5, 6, 7, 8])
+    print(np.concatenate((a_3, b_1)))  # [1 2 3 4 5 6 7 8]
 
+    x_0 = np.array([[1, 2], [3, 4]])
+    print(x_0.ndim)  # 2
+    print(x_0.shape)  # (2, 2)
 
-y_0 = np.array([[5, 6]])
-print(y_0.ndim)  # 2
-print(y_0.shape)  # (1, 2)
-print(np.concatenate((x_0, y_0), axis=0))
-# [[1 2]
-#  [3 4]
-#  [5 6]]
+    y_0 = np.array([[5, 6]])
+    print(y_0.ndim)  # 2
+    print(y_0.shape)  # (1, 2)
+    print(np.concatenate((x_0, y_0), axis=0))
+    # [[1 2]
+    #  [3 4]
+    #  [5 6]]
+
+    y_1 = np.array([[5], [6]])
+    print(np.concatenate((x_0, y_1), axis=1))
+    # [[1 2 5]
+    #  [3 4 6]]
 
-y_1 = np.array([[5], [6]])
-print(np.concatenate((x_0, y_1), axis=1))
-# [[1 2 5]
-#  [3 4 6]]
 
 ########################################################################################
 # How do you know the shape and size of an array?                                      #
 ########################################################################################
-print("\nHow do you know the shape and size of an array?\n")
 
-a_4 = np.array(
-    [
-        [[0, 1, 2, 3], [4, 5, 6, 7]],
-        [[0, 1, 2, 3], [4, 5, 6, 7]],
-        [[0, 1, 2, 3], [4, 5, 6, 7]],
-    ]
-)
 
-# `ndarray.ndim` will tell you the number of axes, or dimensions, of the array`
-print(a_4.ndim)
+@register("How do you know the shape and size of an array?")
+def shape_and_size():
+    a_4 = np.array(
+        [
+            [[0, 1, 2, 3], [4, 5, 6, 7]],
+            [[0, 1, 2, 3], [4, 5, 6, 7]],
+            [[0, 1, 2, 3], [4, 5, 6, 7]],
+        ]
+    )
 
-# `ndarray.size` will tell you the total number of elements of the array. This is the
-# product of the elements of the array's shape.
-print(a_4.size)
+    # `ndarray.ndim` will tell you the number of axes, or dimensions, of the array`
+    print(a_4.ndim)
+
+    # `ndarray.size` will tell you the total number of elements of the array. This is
+    # the product of the elements of the array's shape.
+    print(a_4.size)
+
+    # `ndarray.shape` will display a tuple of integers that indicate the number of
+    # elements stored along each dimension of the array. If, for example, you have a 2-D
+    # array with 2 rows and 3 columns, the shape of your array is (2, 3).
+    print(a_4.shape)
 
-# `ndarray.shape` will display a tuple of integers that indicate the number of elements
-# stored along each dimension of the array. If, for example, you have a 2-D array with 2
-# rows and 3 columns, the shape of your array is (2, 3).
-print(a_4.shape)
 
 ########################################################################################
 # How to convert a 1D array into a 2D array                                            #
 ########################################################################################
-print("\nHow to convert a 1D array into a 2D array\n")
-
-# Using `np.newaxis` will increase the dimensions of your array by one dimension when
-# used once. This means that a 1D array will become a 2D array, a 2D array will become a
-# 3D array, and so on.
-a_5 = np.array([1, 2, 3, 4, 5, 6])
-print(a_5.shape)  # (6,)
-
-a_6 = a_5[np.newaxis, :]
-print(a_6.shape)  # (1, 6)
-print(a_6)  # [[1 2 3 4 5 6]]
-
-# You can explicitly convert a 1D array to either a row vector or a column vector using
-# `np.newaxis`.
-row_vector = a_5[np.newaxis, :]
-print(row_vector.shape)  # (1, 6)
-print(row_vector)  # [[1 2 3 4 5 6]]
-
-col_vector = a_5[:, np.newaxis]
-print(col_vector.shape)  # (6, 1)
-print(col_vector)
-# [[1]
-#  [2]
-#  [3]
-#  [4]
-#  [5]
-#  [6]]
-
-# You can also expand an array by inserting a new axis at a specified position with
-# `np.expand_dims`. You can use `np.expand_dims`` to add an axis at index position 1
-# with:
-b_2 = np.expand_dims(a_5, axis=1)
-print(b_2.shape)  # (6, 1)
-print(b_2)
-# [[1]
-#  [2]
-#  [3]
-#  [4]
-#  [5]
-#  [6]]
-
-c_0 = np.expand_dims(a_5, axis=0)
-print(c_0.shape)  # (1, 6)
-print(c_0)  # [[1 2 3 4 5 6]]
+
+
+@register("How to convert a 1D array into a 2D array")
+def converting_1d_to_2d():
+    # Using `np.newaxis` will increase the dimensions of your array by one dimension
+    # when used once. This means that a 1D array will become a 2D array, a 2D array will
+    # become a 3D array, and so on.
+    a_5 = np.array([1, 2, 3, 4, 5, 6])
+    print(a_5.shape)  # (6,)
+
+    a_6 = a_5[np.newaxis, :]
+    print(a_6.shape)  # (1, 6)
+    print(a_6)  # [[1 2 3 4 5 6]]
+
+    # You can explicitly convert a 1D array to either a row vector or a column vector
+    # using `np.newaxis`.
+    row_vector = a_5[np.newaxis, :]
+    print(row_vector.shape)  # (1, 6)
+    print(row_vector)  # [[1 2 3 4 5 6]]
+
+    col_vector = a_5[:, np.newaxis]
+    print(col_vector.shape)  # (6, 1)
+    print(col_vector)
+    # [[1]
+    #  [2]
+    #  [3]
+    #  [4]
+    #  [5]
+    #  [6]]
+
+    # You can also expand an array by inserting a new axis at a specified position with
+    # `np.expand_dims`. You can use `np.expand_dims`` to add an axis at index position 1
+    # with:
+    b_2 = np.expand_dims(a_5, axis=1)
+    print(b_2.shape)  # (6, 1)
+    print(b_2)
+    # [[1]
+    #  [2]
+    #  [3]
+    #  [4]
+    #  [5]
+    #  [6]]
+
+    c_0 = np.expand_dims(a_5, axis=0)
+    print(c_0.shape)  # (1, 6)
+    print(c_0)  # [[1 2 3 4 5 6]]
+
 
 ########################################################################################
 # Indexing and slicing                                                                 #
 ########################################################################################
-print("\nIndexing and slicing\n")
-
-# You can index and slice NumPy arrays in the same ways you can slice Python lists.
-data_0 = np.array([1, 2, 3])
-
-print(data_0[1])  # 2
-print(data_0[0:2])  # [1 2]
-print(data_0[1:])  # [2 3]
-print(data_0[-2:])  # [2 3]
-
-# If you want to select values from your array that fulfill certain conditions, it's
-# straightforward with NumPy.
-a_7 = np.array([[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12]])
-
-# You can easily print all of the values in the array that are less than 5.
-print(a_7[a_7 < 5])  # [1 2 3 4]
-
-# You can also select numbers that are equal to or greater than 5, and use that
-# condition to index an array.
-five_up = a_7 >= 5
-print(five_up)
-# [[False False False False]
-#  [ True  True  True  True]
-#  [ True  True  True  True]]
-print(a_7[five_up])
-# [ 5  6  7  8  9 10 11 12]
-
-# You can select elements that are divisible by 2:
-divisible_by_2 = a_7[a_7 % 2 == 0]
-print(divisible_by_2)  # [ 2  4  6  8 10 12]
-
-# Or you can select elements that satisfy two conditions using the `&` and `|`
-# operators:
-c_1 = a_7[(a_7 > 2) & (a_7 < 11)]
-print(c_1)  # [ 3  4  5  6  7  8  9 10]
-
-# You can also use `np.nonzero()` to select elements or indices from an array. In this
-# example, a tuple of arrays is returned: one for each dimension. The first array
-# represents the row indices where these values are found, and the second array
-# represents the column indices where the values are found.
-b_3 = np.nonzero(a_7 < 5)
-print(b_3)  # (array([0, 0, 0, 0]), array([0, 1, 2, 3]))
-
-# If you want to generate a list of coordinates where the elements exist, you can zip
-# the arrays, iterate over the list of coordinates, and print them.
-list_of_coordinates = list(zip(b_3[0], b_3[1]))
-for coord in list_of_coordinates:
-    print(coord)
-# (np.int64(0), np.int64(0))
-# (np.int64(0), np.int64(1))
-# (np.int64(0), np.int64(2))
-# (np.int64(0), np.int64(3))
-
-# You can also use `np.nonzero()` to print the elements in an array that are less than 5
-# with:
-print(a_7[b_3])  # [1 2 3 4]
-
-# If the element you're looking for doesn't exist in the array, then the returned array
-# of indices will be empty.
-not_there = np.nonzero(a_7 == 42)
-print(not_there)
-# (array([], dtype=int64), array([], dtype=int64))
+
+
+@register("Indexing and slicing")
+def indexing_and_slicing():
+    global a_7  # pylint: disable=global-statement
+    # You can index and slice NumPy arrays in the same ways you can slice Python lists.
+    data_0 = np.array([1, 2, 3])
+
+    print(data_0[1])  # 2
+    print(data_0[0:2])  # [1 2]
+    print(data_0[1:])  # [2 3]
+    print(data_0[-2:])  # [2 3]
+
+    # If you want to select values from your array that fulfill certain conditions, it's
+    # straightforward with NumPy.
+    a_7 = np.array([[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12]])
+
+    # You can easily print all of the values in the array that are less than 5.
+    print(a_7[a_7 < 5])  # [1 2 3 4]
+
+    # You can also select numbers that are equal to or greater than 5, and use that
+    # condition to index an array.
+    five_up = a_7 >= 5
+    print(five_up)
+    # [[False False False False]
+    #  [ True  True  True  True]
+    #  [ True  True  True  True]]
+    print(a_7[five_up])
+    # [ 5  6  7  8  9 10 11 12]
+
+    # You can select elements that are divisible by 2:
+    divisible_by_2 = a_7[a_7 % 2 == 0]
+    print(divisible_by_2)  # [ 2  4  6  8 10 12]
+
+    # Or you can select elements that satisfy two conditions using the `&` and `|`
+    # operators:
+    c_1 = a_7[(a_7 > 2) & (a_7 < 11)]
+    print(c_1)  # [ 3  4  5  6  7  8  9 10]
+
+    # You can also use `np.nonzero()` to select elements or indices from an array. In
+    # this example, a tuple of arrays is returned: one for each dimension. The first
+    # array represents the row indices where these values are found, and the second
+    # array represents the column indices where the values are found.
+    b_3 = np.nonzero(a_7 < 5)
+    print(b_3)  # (array([0, 0, 0, 0]), array([0, 1, 2, 3]))
+
+    # If you want to generate a list of coordinates where the elements exist, you can
+    # zip the arrays, iterate over the list of coordinates, and print them.
+    list_of_coordinates = list(zip(b_3[0], b_3[1]))
+    for coord in list_of_coordinates:
+        print(coord)
+    # (np.int64(0), np.int64(0))
+    # (np.int64(0), np.int64(1))
+    # (np.int64(0), np.int64(2))
+    # (np.int64(0), np.int64(3))
+
+    # You can also use `np.nonzero()` to print the elements in an array that are less
+    # than 5 with:
+    print(a_7[b_3])  # [1 2 3 4]
+
+    # If the element you're looking for doesn't exist in the array, then the returned
+    # array of indices will be empty.
+    not_there = np.nonzero(a_7 == 42)
+    print(not_there)
+    # (array([], dtype=int64), array([], dtype=int64))
+
+
+########################################################################################
+# Filtering large arrays in chunks                                                     #
+########################################################################################
+
+# A condition such as `(a_7 > 2) & (a_7 < 11)` creates a full-size boolean array for
+# every comparison and another one for the `&`, all before a single element has been
+# selected. If you pass the condition as a function instead, it can be applied to one
+# chunk of the array at a time, so the temporaries never grow beyond the chunk size.
+
+
+def _row_blocks(a, chunk_size):
+    """Yield the first row and a view of every block of about `chunk_size` elements."""
+    step = max(1, chunk_size // max(math.prod(a.shape[1:]), 1))
+    for start in range(0, len(a), step):
+        yield start, a[start : start + step]
+
+
+def filter_chunked(a, condition, chunk_size=1 << 16, coordinates=False):
+    """Return the elements of `a` for which `condition` holds, or their indices.
+
+    The chunks are blocks of whole rows (about `chunk_size` elements each), which are
+    views even if `a` isn't contiguous.
+    """
+    pieces = []
+    for start, chunk in _row_blocks(a, chunk_size):
+        mask = condition(chunk)
+        if coordinates:
+            rows, *others = np.nonzero(mask)
+            pieces.append((rows + start, *others))
+        else:
+            pieces.append(chunk[mask])
+    if not coordinates:
+        return np.concatenate(pieces) if pieces else np.empty(0, dtype=a.dtype)
+    # Like `np.nonzero`, the coordinates are returned as one index array per dimension.
+    if not pieces:
+        return tuple(np.empty(0, dtype=np.intp) for _ in range(a.ndim))
+    return tuple(np.concatenate(axis) for axis in zip(*pieces))
+
+
+@register("Filtering large arrays in chunks", needs=[indexing_and_slicing])
+def filtering_in_chunks():
+    print(filter_chunked(a_7, lambda x: (x > 2) & (x < 11), chunk_size=5))
+    # [ 3  4  5  6  7  8  9 10]
+    print(filter_chunked(a_7, lambda x: x % 2 == 0, chunk_size=5))
+    # [ 2  4  6  8 10 12]
+    print(filter_chunked(a_7, lambda x: x < 5, chunk_size=5, coordinates=True))
+    # (array([0, 0, 0, 0]), array([0, 1, 2, 3]))
+
+
+########################################################################################
+# Working with coordinates as an array                                                 #
+########################################################################################
+
+# `np.argwhere()` needs the whole mask at once. For large arrays, it can instead be
+# applied to the blocks of rows that `filter_chunked()` uses, with the row numbers of
+# every batch shifted by the first row of its block.
+
+
+def argwhere_chunked(a, condition, chunk_size=1 << 16):
+    """Yield the coordinates where `condition` holds, as (N, ndim) arrays per block."""
+    for start, chunk in _row_blocks(a, chunk_size):
+        batch = np.argwhere(condition(chunk))
+        if len(batch):
+            batch[:, 0] += start
+            yield batch
+
+
+@register("Working with coordinates as an array", needs=[indexing_and_slicing])
+def coordinates_as_an_array():
+    # Zipping the output of `np.nonzero()` creates one Python tuple of boxed integers
+    # per match, which gets slow when there are millions of matches. `np.argwhere()`
+    # returns the same coordinates as one contiguous (N, ndim) integer array instead,
+    # with one row per match.
+    coords_0 = np.argwhere(a_7 < 5)
+    print(coords_0)
+    # [[0 0]
+    #  [0 1]
+    #  [0 2]
+    #  [0 3]]
+    print(coords_0.shape)  # (4, 2)
+
+    # With the condition given as a function, the coordinates can also be produced in
+    # batches, one block of rows at a time, so that neither the whole mask nor the
+    # whole (N, ndim) array ever exists.
+    for batch in argwhere_chunked(a_7, lambda x: x % 5 == 0, chunk_size=4):
+        print(batch.tolist())
+    # [[1, 0]]
+    # [[2, 1]]
+
+    # To use the coordinates as a fancy index again, turn the columns back into a tuple.
+    print(a_7[tuple(coords_0.T)])  # [1 2 3 4]
+
+    # Coordinates can also be packed into flat indices, which take a single integer per
+    # match and can index the flattened array directly.
+    flat_indices = np.ravel_multi_index(tuple(coords_0.T), a_7.shape)
+    print(flat_indices)  # [0 1 2 3]
+    print(a_7.reshape(-1)[flat_indices])  # [1 2 3 4]
+
 
 ########################################################################################
 # How to create an array from existing data                                            #
 ########################################################################################
-print("\nHow to create an array from existing data\n")
 
-a_8 = np.array([1, 2, 3, 4, 5, 6, 7, 8, 9, 10])
 
-# You can create a new array from a section of your array any time by specifying where
-# you want to slice your array.
-arr_0 = a_8[3:8]
-print(arr_0)  # [4 5 6 7 8]
+@register("How to create an array from existing data")
+def arrays_from_existing_data():
+    global a_10, a_11, a_9  # pylint: disable=global-statement
+    a_8 = np.array([1, 2, 3, 4, 5, 6, 7, 8, 9, 10])
+
+    # You can create a new array from a section of your array any time by specifying
+    # where you want to slice your array.
+    arr_0 = a_8[3:8]
+    print(arr_0)  # [4 5 6 7 8]
+
+    # You can also stack two existing arrays, both vertically and horizontally.
+    a_9 = np.array([[1, 1], [2, 2]])
+    a_10 = np.array([[3, 3], [4, 4]])
 
-# You can also stack two existing arrays, both vertically and horizontally.
-a_9 = np.array([[1, 1], [2, 2]])
-a_10 = np.array([[3, 3], [4, 4]])
+    print(np.vstack((a_9, a_10)))
+    # [[1 1]
+    #  [2 2]
+    #  [3 3]
+    #  [4 4]]
 
-print(np.vstack((a_9, a_10)))
-# [[1 1]
-#  [2 2]
-#  [3 3]
-#  [4 4]]
+    print(np.hstack((a_9, a_10)))
+    # [[1 1 3 3]
+    #  [2 2 4 4]]
 
-print(np.hstack((a_9, a_10)))
-# [[1 1 3 3]
-#  [2 2 4 4]]
+    # You can use the `view` method to create a new array object that looks at the same
+    # data as the original array (a shallow copy). Views are an important NumPy concept!
+    # NumPy functions, as well as operations like indexing and slicing, will return
+    # views whenever possible. This saves memory and is faster (no copy of the data has
+    # to be made). However it's important to be aware of this - modifying data in a view
+    # also modifies the original array!
+    a_11 = np.array([[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12]])
 
-# You can use the `view` method to create a new array object that looks at the same data
-# as the original array (a shallow copy). Views are an important NumPy concept! NumPy
-# functions, as well as operations like indexing and slicing, will return views whenever
-# possible. This saves memory and is faster (no copy of the data has to be made).
-# However it's important to be aware of this - modifying data in a view also modifies
-# the original array!
-a_11 = np.array([[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12]])
+    b_4 = a_11[0, :]
+    print(b_4)  # [1 2 3 4]
 
-b_4 = a_11[0, :]
-print(b_4)  # [1 2 3 4]
+    b_4[0] = 99
+    print(b_4)  # [99  2  3  4]
+    print(a_11)
+    # [[99  2  3  4]
+    #  [ 5  6  7  8]
+    #  [ 9 10 11 12]]
 
-b_4[0] = 99
-print(b_4)  # [99  2  3  4]
-print(a_11)
-# [[99  2  3  4]
-#  [ 5  6  7  8]
-#  [ 9 10 11 12]]
+    # Using the copy method will make a complete copy of the array and its data (a deep
+    # copy).
+    b_5 = a_11.copy()
+
+
+########################################################################################
+# Growing an array without copying it every time                                       #
+########################################################################################
+
+# `np.concatenate()`, `np.vstack()` and `np.hstack()` copy all of their inputs into a
+# new array. Appending rows one at a time that way copies everything that came before on
+# every call, so the total work grows quadratically. Instead, you can append into a
+# preallocated buffer that doubles its capacity whenever it runs full, which makes every
+# append cost amortized constant time.
+
+
+class ArrayBuilder:
+    """Collect rows (`axis=0`) or columns (`axis=1`) into a growing buffer."""
+
+    def __init__(self, shape, dtype=float, axis=0, capacity=16):
+        # The buffer always grows along its first axis; appending columns is done by
+        # storing the transpose, so that the columns are contiguous too.
+        self.axis = axis
+        self.dtype = np.dtype(dtype)
+        self.length = 0
+        other = tuple(n for i, n in enumerate(shape) if i != axis)
+        self._buffer = np.empty((capacity,) + other, dtype=self.dtype)
+
+    def append(self, block):
+        block = np.moveaxis(np.asarray(block), self.axis, 0)
+        if block.shape[1:] != self._buffer.shape[1:]:
+            raise ValueError(
+                f"cannot append {block.shape[1:]} to {self._buffer.shape[1:]}"
+            )
+        if not np.can_cast(block.dtype, self.dtype, "same_kind"):
+            raise TypeError(f"cannot append {block.dtype} to {self.dtype}")
+        end = self.length + len(block)
+        if end > len(self._buffer):
+            capacity = max(end, 2 * len(self._buffer))
+            grown = np.empty((capacity,) + self._buffer.shape[1:], dtype=self.dtype)
+            grown[: self.length] = self._buffer[: self.length]
+            self._buffer = grown
+        self._buffer[self.length : end] = block
+        self.length = end
+
+    @property
+    def view(self):
+        """The filled part of the buffer, without copying it."""
+        return np.moveaxis(self._buffer[: self.length], 0, self.axis)
+
+    def finalize(self):
+        """Trim the buffer to its filled part, in place when nothing else uses it."""
+        try:
+            self._buffer.resize((self.length,) + self._buffer.shape[1:])
+        except ValueError:
+            self._buffer = self._buffer[: self.length].copy()
+        return self.view
+
+
+@register(
+    "Growing an array without copying it every time", needs=[arrays_from_existing_data]
+)
+def growing_an_array():
+    builder_0 = ArrayBuilder(a_9.shape, dtype=a_9.dtype, capacity=1)
+    for row in np.concatenate((a_9, a_10)):
+        builder_0.append(row[np.newaxis, :])
+    print(builder_0.view)
+    # [[1 1]
+    #  [2 2]
+    #  [3 3]
+    #  [4 4]]
+
+    builder_1 = ArrayBuilder(a_9.shape, dtype=a_9.dtype, axis=1)
+    builder_1.append(a_9)
+    builder_1.append(a_10)
+    print(builder_1.finalize())
+    # [[1 1 3 3]
+    #  [2 2 4 4]]
+
+    # Since the builder knows the shape and data type of its rows, it rejects blocks
+    # that don't fit instead of silently producing something else.
+    try:
+        builder_1.append(np.array([[0.5], [1.5]]))
+    except TypeError as error:
+        print(error)  # cannot append float64 to int64
+
+
+########################################################################################
+# Finding out where arrays get copied                                                  #
+########################################################################################
+
+# It isn't always obvious which operations return a view and which ones silently copy.
+# NumPy reports the memory it allocates for array data to `tracemalloc`, so you can
+# record the array data allocated inside a block of code together with the line of your
+# code that caused it. `np.shares_memory()` tells whether a single result is a view.
+#
+# `tracemalloc` only lists the allocations that are still alive, so the call sites
+# below only include arrays that outlive the block. Temporary copies that are freed
+# inside the block don't show up there, but they do raise the block's peak memory,
+# which is recorded too. Shapes and data types are only known for the results you
+# pass to `check()`.
+
+
+class CopyTracker:
+    """Record the array data allocated inside a `with` block, and views vs. copies.
+
+    With `strict=True`, a checked result that turns out to be a copy raises an error,
+    and so does the block if it allocates array data along the way. Python itself
+    allocates a little memory for the objects in the block, so a peak of up to `slack`
+    bytes is let through.
+    """
+
+    def __init__(self, strict=False, slack=4096):
+        self.strict = strict
+        self.slack = slack
+        self.checks = []
+        self.sites = {}
+
+    def __enter__(self):
+        # Tracing may already be on, for example when profiling with `profiling.py`.
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start(32)
+        # If tracing was already on, the peak can't be reset without disturbing the
+        # other user, so it may then include memory used before the block.
+        self._start = tracemalloc.take_snapshot()
+        self._base = tracemalloc.get_traced_memory()[0]
+        if self._started:
+            tracemalloc.reset_peak()
+        return self
+
+    def check(self, result, source):
+        """Record whether `result` is a view of `source`, and return it unchanged."""
+        frame = inspect.currentframe().f_back
+        site = f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno}"
+        is_view = np.shares_memory(result, source)
+        self.checks.append((site, is_view, result.shape, result.dtype, result.nbytes))
+        if self.strict and not is_view:
+            raise RuntimeError(f"unexpected copy of {result.nbytes} bytes")
+        return result
+
+    def __exit__(self, *exc_info):
+        # Only arrays that are still alive at the end of the block show up here.
+        # The peak covers all memory traced by Python, not just array data.
+        self.peak = tracemalloc.get_traced_memory()[1] - self._base
+        numpy_data = [tracemalloc.DomainFilter(True, np.lib.tracemalloc_domain)]
+        end = tracemalloc.take_snapshot().filter_traces(numpy_data)
+        start = self._start.filter_traces(numpy_data)
+        if self._started:
+            tracemalloc.stop()
+        numpy_dir = os.path.dirname(np.__file__)
+        for stat in end.compare_to(start, "traceback"):
+            if stat.size_diff > 0:
+                frames = [f for f in stat.traceback if numpy_dir not in f.filename]
+                frame = frames[-1] if frames else stat.traceback[-1]
+                site = f"{os.path.basename(frame.filename)}:{frame.lineno}"
+                self.sites[site] = self.sites.get(site, 0) + stat.size_diff
+        # An error raised inside the block takes precedence.
+        if self.strict and exc_info[0] is None:
+            if self.sites:
+                raise RuntimeError(f"copies left behind at {', '.join(self.sites)}")
+            if self.peak > self.slack:
+                raise RuntimeError(f"temporary copies of up to {self.peak} bytes")
+
+    def top_sites(self, n=10):
+        """The call sites that allocated the most bytes, largest first."""
+        return sorted(self.sites.items(), key=lambda item: item[1], reverse=True)[:n]
+
+
+@register("Finding out where arrays get copied", needs=[arrays_from_existing_data])
+def finding_copies():
+    with CopyTracker() as tracker_0:
+        b_8 = tracker_0.check(a_11[0, :], a_11)
+        b_9 = tracker_0.check(a_11[[0, 2]], a_11)
+        b_10 = tracker_0.check(a_11.copy(), a_11)
+    for site, is_view, shape, dtype, nbytes in tracker_0.checks:
+        print(is_view, shape, dtype, nbytes)
+    # True (4,) int64 32
+    # False (2, 4) int64 64
+    # False (3, 4) int64 96
+    print([nbytes for site, nbytes in tracker_0.top_sites()])  # [96, 64]
+
+    # A temporary copy, such as the result of `a_11 * 2` here, has been freed by the end
+    # of the block, so it has no call site, but it still shows up in the peak.
+    with CopyTracker() as tracker_2:
+        total_0 = (a_11 * 2).sum()
+    print(tracker_2.sites, tracker_2.peak >= (a_11 * 2).nbytes)  # {} True
+
+    # In strict mode, an unexpected copy stops the program right where it happens.
+    try:
+        with CopyTracker(strict=True) as tracker_1:
+            b_11 = tracker_1.check(a_11[:, 1], a_11)
+            b_12 = tracker_1.check(a_11[:, [1]], a_11)
+    except RuntimeError as error:
+        print(error)  # unexpected copy of 24 bytes
+
+    # A strict block also catches the copies that were never checked, even the
+    # temporary ones.
+    c_5 = np.ones(10_000)
+    try:
+        with CopyTracker(strict=True) as tracker_3:
+            total_2 = (c_5 * 2).sum()
+    except RuntimeError as error:
+        print(type(error).__name__, tracker_3.peak >= c_5.nbytes)  # RuntimeError True
 
-# Using the copy method will make a complete copy of the array and its data (a deep
-# copy).
-b_5 = a_11.copy()
 
 ########################################################################################
 # Basic array operations                                                               #
 ########################################################################################
-print("\nBasic array operations\n")
 
-data_1 = np.array([1, 2])
-ones = np.ones(2, dtype=int)
-print(data_1 + ones)  # [2 3]
-print(data_1 - ones)  # [0 1]
-print(data_1 * data_1)  # [1 4]
-print(data_1 / data_1)  # [1. 1.]
 
-# If you want to find the sum of the elements in an array, you'd use `sum()`.
-a_12 = np.array([1, 2, 3, 4])
-print(a_12.sum())
+@register("Basic array operations")
+def basic_operations():
+    global a_12, b_6, data_1, ones  # pylint: disable=global-statement
+    data_1 = np.array([1, 2])
+    ones = np.ones(2, dtype=int)
+    print(data_1 + ones)  # [2 3]
+    print(data_1 - ones)  # [0 1]
+    print(data_1 * data_1)  # [1 4]
+    print(data_1 / data_1)  # [1. 1.]
+
+    # If you want to find the sum of the elements in an array, you'd use `sum()`.
+    a_12 = np.array([1, 2, 3, 4])
+    print(a_12.sum())
+
+    # To add the rows or the columns in a 2D array, you would specify the axis.
+    b_6 = np.array([[1, 1], [2, 2]])
+    print(b_6.sum(axis=0))  # [3 3]
+    print(b_6.sum(axis=1))  # [2 4]
 
-# To add the rows or the columns in a 2D array, you would specify the axis.
-b_6 = np.array([[1, 1], [2, 2]])
-print(b_6.sum(axis=0))  # [3 3]
-print(b_6.sum(axis=1))  # [2 4]
 
 ########################################################################################
 # Broadcasting                                                                         #
 ########################################################################################
-print("\nBroadcasting\n")
 
-# There are times when you might want to carry out an operation between an array and a
-# single number (also called an operation between a vector and a scalar) or between
-# arrays of two different sizes.
 
-# NumPy understands that the following multiplication should happen with each cell. That
-# concept is called broadcasting. Broadcasting is a mechanism that allows NumPy to
-# perform operations on arrays of different shapes. The dimensions of your array must be
-# compatible, for example, when the dimensions of both arrays are equal or when one of
-# them is 1.
-data_2 = np.array([1.0, 2.0])
-print(data_2 * 1.6)  # [1.6 3.2]
+@register("Broadcasting")
+def broadcasting():
+    global data_2  # pylint: disable=global-statement
+    # There are times when you might want to carry out an operation between an array and
+    # a single number (also called an operation between a vector and a scalar) or
+    # between arrays of two different sizes.
+
+    # NumPy understands that the following multiplication should happen with each cell.
+    # That concept is called broadcasting. Broadcasting is a mechanism that allows NumPy
+    # to perform operations on arrays of different shapes. The dimensions of your array
+    # must be compatible, for example, when the dimensions of both arrays are equal or
+    # when one of them is 1.
+    data_2 = np.array([1.0, 2.0])
+    print(data_2 * 1.6)  # [1.6 3.2]
+
 
 ########################################################################################
 # More useful array operations                                                         #
 ########################################################################################
-print("\nMore useful array operations\n")
-
-# NumPy also performs aggregation functions. In addition to `min`, `max`, and `sum`, you
-# can easily run `mean` to get the average, `prod` to get the result of multiplying the
-# elements together, `std` to get the standard deviation, and more.
-data_3 = np.array([1.0, 2.0])
-print(data_3.max())  # 2.0
-print(data_3.min())  # 1.0
-print(data_3.sum())  # 3.0
-
-# Let's start with this array, called `a`:
-a_13 = np.array(
-    [
-        [0.45053314, 0.17296777, 0.34376245, 0.5510652],
-        [0.54627315, 0.05093587, 0.40067661, 0.55645993],
-        [0.12697628, 0.82485143, 0.26590556, 0.56917101],
-    ]
-)
-print(a_13.sum())  # 4.8595784
-print(a_13.min())  # 0.05093587
 
-# You can specify on which axis you want the aggregation function to be computed. For
-# example, you can find the minimum value within each column by specifying `axis=0`.
-print(a_13.min(axis=0))  # [0.12697628 0.05093587 0.26590556 0.5510652 ]
+
+@register("More useful array operations")
+def more_operations():
+    global a_13  # pylint: disable=global-statement
+    # NumPy also performs aggregation functions. In addition to `min`, `max`, and `sum`,
+    # you can easily run `mean` to get the average, `prod` to get the result of
+    # multiplying the elements together, `std` to get the standard deviation, and more.
+    data_3 = np.array([1.0, 2.0])
+    print(data_3.max())  # 2.0
+    print(data_3.min())  # 1.0
+    print(data_3.sum())  # 3.0
+
+    # Let's start with this array, called `a`:
+    a_13 = np.array(
+        [
+            [0.45053314, 0.17296777, 0.34376245, 0.5510652],
+            [0.54627315, 0.05093587, 0.40067661, 0.55645993],
+            [0.12697628, 0.82485143, 0.26590556, 0.56917101],
+        ]
+    )
+    print(a_13.sum())  # 4.8595784
+    print(a_13.min())  # 0.05093587
+
+    # You can specify on which axis you want the aggregation function to be computed.
+    # For example, you can find the minimum value within each column by specifying
+    # `axis=0`.
+    print(a_13.min(axis=0))  # [0.12697628 0.05093587 0.26590556 0.5510652 ]
+
 
 ########################################################################################
 # Creating matrices                                                                    #
 ########################################################################################
-print("\nCreating matrices\n")
-
-# You can pass Python lists of lists to create a 2-D array (or "matrix") to represent
-# them in NumPy.
-
-data_4 = np.array([[1, 2], [3, 4], [5, 6]])
-print(data_4)
-# [[1 2]
-#  [3 4]
-#  [5 6]]
-
-# Indexing and slicing operations are useful when you're manipulating matrices:
-print(data_4[0, 1])  # 2
-print(data_4[1:3])
-# [[3 4]
-#  [5 6]]
-print(data_4[0:2, 0])  # [1 3]
-
-# You can aggregate matrices the same way you aggregated vectors:
-print(data_4.max())  # 6
-print(data_4.min())  # 1
-print(data_4.sum())  # 21
-
-# You can aggregate all the values in a matrix and you can aggregate them across columns
-# or rows using the `axis` parameter.
-data_5 = np.array([[1, 2], [5, 3], [4, 6]])
-print(data_5)
-# [[1 2]
-#  [5 3]
-#  [4 6]]
-print(data_5.max(axis=0))  # [5 6]
-print(data_5.max(axis=1))  # [2 5 6]
-
-# You can do these arithmetic operations on matrices of different sizes, but only if one
-# matrix has only one column or one row. In this case, NumPy will use its broadcast
-# rules for the operation.
-data_6 = np.array([[1, 2], [3, 4], [5, 6]])
-ones_row = np.array([1, 1])
-print(data_6 + ones_row)
-# [[2 3]
-#  [4 5]
-#  [6 7]]
-
-# Be aware that when NumPy prints N-dimensional arrays, the last axis is looped over the
-# fastest while the first axis is the slowest.
-print(np.ones((4, 3, 2)))
-# [[[1. 1.]
-#   [1. 1.]
-#   [1. 1.]]
-#  [[1. 1.]
-#   [1. 1.]
-#   [1. 1.]]
-#  [[1. 1.]
-#   [1. 1.]
-#   [1. 1.]]
-#  [[1. 1.]
-#   [1. 1.]
-#   [1. 1.]]]
-
-# There are often instances where we want NumPy to initialize the values of an array.
-# NumPy offers functions like `ones()` and `zeros()`, and the `random.Generator` class
-# for random number generation for that.
-print(np.ones(3))  # [1. 1. 1.]
-print(np.zeros(3))  # [0. 0. 0.]
-rng = np.random.default_rng()
-print(rng.random(3))  # [0.04684997 0.89084346 0.15499562]
-
-# You can also use `ones()`, `zeros()`, and `random()` to create a 2D array if you give
-# them a tuple describing the dimensions of the matrix:
-print(np.ones((3, 2)))
-# [[1. 1.]
-#  [1. 1.]
-#  [1. 1.]]
-print(np.zeros((3, 2)))
-# [[0. 0.]
-#  [0. 0.]
-#  [0. 0.]]
-print(rng.random((3, 2)))
-# [[0.70594248 0.02637369]
-#  [0.85647803 0.11083294]
-#  [0.07493274 0.36550293]]
+
+
+@register("Creating matrices")
+def creating_matrices():
+    global data_5, data_6, ones_row  # pylint: disable=global-statement
+    # You can pass Python lists of lists to create a 2-D array (or "matrix") to
+    # represent them in NumPy.
+
+    data_4 = np.array([[1, 2], [3, 4], [5, 6]])
+    print(data_4)
+    # [[1 2]
+    #  [3 4]
+    #  [5 6]]
+
+    # Indexing and slicing operations are useful when you're manipulating matrices:
+    print(data_4[0, 1])  # 2
+    print(data_4[1:3])
+    # [[3 4]
+    #  [5 6]]
+    print(data_4[0:2, 0])  # [1 3]
+
+    # You can aggregate matrices the same way you aggregated vectors:
+    print(data_4.max())  # 6
+    print(data_4.min())  # 1
+    print(data_4.sum())  # 21
+
+    # You can aggregate all the values in a matrix and you can aggregate them across
+    # columns or rows using the `axis` parameter.
+    data_5 = np.array([[1, 2], [5, 3], [4, 6]])
+    print(data_5)
+    # [[1 2]
+    #  [5 3]
+    #  [4 6]]
+    print(data_5.max(axis=0))  # [5 6]
+    print(data_5.max(axis=1))  # [2 5 6]
+
+    # You can do these arithmetic operations on matrices of different sizes, but only if
+    # one matrix has only one column or one row. In this case, NumPy will use its
+    # broadcast rules for the operation.
+    data_6 = np.array([[1, 2], [3, 4], [5, 6]])
+    ones_row = np.array([1, 1])
+    print(data_6 + ones_row)
+    # [[2 3]
+    #  [4 5]
+    #  [6 7]]
+
+    # Be aware that when NumPy prints N-dimensional arrays, the last axis is looped over
+    # the fastest while the first axis is the slowest.
+    print(np.ones((4, 3, 2)))
+    # [[[1. 1.]
+    #   [1. 1.]
+    #   [1. 1.]]
+    #  [[1. 1.]
+    #   [1. 1.]
+    #   [1. 1.]]
+    #  [[1. 1.]
+    #   [1. 1.]
+    #   [1. 1.]]
+    #  [[1. 1.]
+    #   [1. 1.]
+    #   [1. 1.]]]
+
+    # There are often instances where we want NumPy to initialize the values of an
+    # array. NumPy offers functions like `ones()` and `zeros()`, and the
+    # `random.Generator` class for random number generation for that.
+    print(np.ones(3))  # [1. 1. 1.]
+    print(np.zeros(3))  # [0. 0. 0.]
+    rng = np.random.default_rng()
+    print(rng.random(3))  # [0.04684997 0.89084346 0.15499562]
+
+    # You can also use `ones()`, `zeros()`, and `random()` to create a 2D array if you
+    # give them a tuple describing the dimensions of the matrix:
+    print(np.ones((3, 2)))
+    # [[1. 1.]
+    #  [1. 1.]
+    #  [1. 1.]]
+    print(np.zeros((3, 2)))
+    # [[0. 0.]
+    #  [0. 0.]
+    #  [0. 0.]]
+    print(rng.random((3, 2)))
+    # [[0.70594248 0.02637369]
+    #  [0.85647803 0.11083294]
+    #  [0.07493274 0.36550293]]
+
 
 ########################################################################################
-# How to get unique items and counts                                                   #
+# Evaluating chains of operations lazily                                               #
 ########################################################################################
-print("\nHow to get unique items and counts\n")
-
-a_14 = np.array([11, 11, 12, 13, 14, 15, 16, 17, 12, 13, 11, 14, 18, 19, 20])
-
-# You can find the unique elements in an array easily with `np.unique`.
-unique_values_0 = np.unique(a_14)
-print(unique_values_0)  # [11 12 13 14 15 16 17 18 19 20]
-
-# To get the indices of unique values in a NumPy array (an array of first index
-# positions of unique values in the array), just pass the `return_index` argument in
-# `np.unique()` as well as your array.
-unique_values_1, indices_list = np.unique(a_14, return_index=True)
-print(indices_list)  # [ 0  2  3  4  5  6  7 12 13 14]
-
-# You can pass the `return_counts` argument in `np.unique()` along with your array to
-# get the frequency count of unique values in a NumPy array.
-unique_values_2, occurrence_count = np.unique(a_14, return_counts=True)
-print(occurrence_count)  # [3 2 2 2 1 1 1 1 1 1]
-
-# This also works with 2D arrays! If the axis argument isn't passed, your 2D array will
-# be flattened.
-a_2d = np.array([[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12], [1, 2, 3, 4]])
-print(np.unique(a_2d))  # [ 1  2  3  4  5  6  7  8  9 10 11 12]
-
-# If you want to get the unique rows or columns, make sure to pass the axis argument. To
-# find the unique rows, specify `axis=0` and for columns, specify `axis=1`.
-unique_rows = np.unique(a_2d, axis=0)
-print(unique_rows)
-# [[ 1  2  3  4]
-#  [ 5  6  7  8]
-#  [ 9 10 11 12]]
-
-# To get the unique rows, index position, and occurrence count, you can use:
-unique_rows, indices, occurrence_count = np.unique(
-    a_2d, axis=0, return_counts=True, return_index=True
+
+# An expression such as `(data_6 * 1.6 + ones_row) / col` is evaluated one operator at
+# a time, and every operator allocates a full-size result that the next one reads back
+# from memory. If you record the operations instead of running them, the whole chain
+# can later be evaluated block by block: each block of rows passes through all of the
+# operations while it is still in cache, and only the final result is written out.
+
+
+class Lazy:
+    """An elementwise expression that is evaluated only when its result is needed."""
+
+    def __init__(self, value, ufunc=None, args=()):
+        self.ufunc = ufunc
+        self.args = args if ufunc else (value,)
+        self.shape = np.broadcast_shapes(*(np.shape(arg) for arg in self.args))
+
+    def _apply(ufunc, reflected=False):
+        def apply(self, other):
+            return Lazy(None, ufunc, (other, self) if reflected else (self, other))
+
+        return apply
+
+    __add__, __radd__ = _apply(np.add), _apply(np.add, reflected=True)
+    __sub__, __rsub__ = _apply(np.subtract), _apply(np.subtract, reflected=True)
+    __mul__, __rmul__ = _apply(np.multiply), _apply(np.multiply, reflected=True)
+    __truediv__ = _apply(np.true_divide)
+    __rtruediv__ = _apply(np.true_divide, reflected=True)
+    del _apply
+
+    def _block(self, rows, shape, out=None):
+        # Operands are broadcast to the shape of the whole expression, which only
+        # creates views, and then cut down to the rows of the current block.
+        args = [
+            (
+                arg._block(rows, shape)
+                if isinstance(arg, Lazy)
+                else np.broadcast_to(arg, shape)[rows] if np.ndim(arg) else arg
+            )
+            for arg in self.args
+        ]
+        if self.ufunc is not None:
+            return self.ufunc(*args, out=out)
+        if out is None:
+            return args[0]
+        out[...] = args[0]
+        return out
+
+    @property
+    def dtype(self):
+        return self._block(slice(0, 0), self.shape).dtype
+
+    def _blocks(self, block_bytes):
+        row_bytes = self.dtype.itemsize * math.prod(self.shape[1:])
+        step = max(1, block_bytes // max(row_bytes, 1))
+        for start in range(0, self.shape[0], step):
+            yield slice(start, start + step)
+
+    def evaluate(self, out=None, block_bytes=1 << 16):
+        """Compute the expression, writing into `out` if it is given."""
+        if out is None:
+            out = np.empty(self.shape, dtype=self.dtype)
+        for rows in self._blocks(block_bytes):
+            self._block(rows, self.shape, out=out[rows])
+        return out
+
+    def sum(self, block_bytes=1 << 16):
+        """Sum the expression without ever materializing all of it."""
+        return sum(
+            self._block(rows, self.shape).sum() for rows in self._blocks(block_bytes)
+        )
+
+
+@register(
+    "Evaluating chains of operations lazily", needs=[broadcasting, creating_matrices]
 )
-print(unique_rows)
-# [[ 1  2  3  4]
-#  [ 5  6  7  8]
-#  [ 9 10 11 12]]
-print(indices)  # [0 1 2]
-print(occurrence_count)  # [2 1 1]
+def lazy_evaluation():
+    col = np.array([[1.0], [2.0], [4.0]])
+    expression_0 = (Lazy(data_6) * 1.6 + ones_row) / col
+    print(expression_0.shape)  # (3, 2)
+
+    # Nothing has been computed yet. The expression is evaluated when you ask for it,
+    # here one row at a time:
+    print(expression_0.evaluate(block_bytes=16))
+    # [[2.6  4.2 ]
+    #  [2.9  3.7 ]
+    #  [2.25 2.65]]
+    print(np.allclose(expression_0.evaluate(), (data_6 * 1.6 + ones_row) / col))  # True
+    print(expression_0.sum(block_bytes=16))  # 18.300000000000004
+    print((Lazy(data_2) * 1.6).evaluate())  # [1.6 3.2]
+
+
+########################################################################################
+# Generating random numbers on several cores                                           #
+########################################################################################
+
+# A single `Generator` produces its numbers one after the other, on one core. To fill a
+# large array on several threads, you can split the array into fixed-size chunks and
+# give every chunk its own independent generator, spawned from one `SeedSequence`.
+# Because the chunks and their seeds don't depend on the number of threads, the result
+# is the same for a given seed no matter how many threads fill it.
+
+
+def parallel_random(shape, seed, out=None, workers=None, chunk_size=1 << 16):
+    """Fill an array of the given shape with random floats in [0, 1) on threads."""
+    if out is None:
+        out = np.empty(shape)
+    # A flat view is only possible without copying if `out` is C-contiguous, and the
+    # numbers written into a copy would never reach `out`.
+    if not out.flags.c_contiguous:
+        raise ValueError("parallel_random() needs a C-contiguous output array")
+    flat = out.reshape(-1)
+    starts = range(0, flat.size, chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+
+    def fill(start, seed):
+        chunk = flat[start : start + chunk_size]
+        np.random.default_rng(seed).random(out=chunk)
+
+    with futures.ThreadPoolExecutor(workers or os.cpu_count()) as pool:
+        list(pool.map(fill, starts, seeds))
+    return out
+
+
+@register("Generating random numbers on several cores")
+def parallel_random_numbers():
+    c_2 = parallel_random((3, 2), seed=42, workers=1, chunk_size=2)
+    c_3 = parallel_random((3, 2), seed=42, workers=3, chunk_size=2)
+    print(np.array_equal(c_2, c_3))  # True
+
+    # Since the output array can be passed in, you can also generate directly into a
+    # memory-mapped file, without ever holding the whole array in memory.
+    c_4 = np.lib.format.open_memmap("random.npy", mode="w+", shape=(3, 2))
+    parallel_random(c_4.shape, seed=42, out=c_4, chunk_size=2)
+    c_4.flush()
+    print(np.array_equal(np.load("random.npy"), c_2))  # True
+
+
+########################################################################################
+# How to get unique items and counts                                                   #
+########################################################################################
+
+
+@register("How to get unique items and counts")
+def unique_items_and_counts():
+    global a_14, a_2d  # pylint: disable=global-statement
+    a_14 = np.array([11, 11, 12, 13, 14, 15, 16, 17, 12, 13, 11, 14, 18, 19, 20])
+
+    # You can find the unique elements in an array easily with `np.unique`.
+    unique_values_0 = np.unique(a_14)
+    print(unique_values_0)  # [11 12 13 14 15 16 17 18 19 20]
+
+    # To get the indices of unique values in a NumPy array (an array of first index
+    # positions of unique values in the array), just pass the `return_index` argument in
+    # `np.unique()` as well as your array.
+    unique_values_1, indices_list = np.unique(a_14, return_index=True)
+    print(indices_list)  # [ 0  2  3  4  5  6  7 12 13 14]
+
+    # You can pass the `return_counts` argument in `np.unique()` along with your array
+    # to get the frequency count of unique values in a NumPy array.
+    unique_values_2, occurrence_count = np.unique(a_14, return_counts=True)
+    print(occurrence_count)  # [3 2 2 2 1 1 1 1 1 1]
+
+    # This also works with 2D arrays! If the axis argument isn't passed, your 2D array
+    # will be flattened.
+    a_2d = np.array([[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12], [1, 2, 3, 4]])
+    print(np.unique(a_2d))  # [ 1  2  3  4  5  6  7  8  9 10 11 12]
+
+    # If you want to get the unique rows or columns, make sure to pass the axis
+    # argument. To find the unique rows, specify `axis=0` and for columns, specify
+    # `axis=1`.
+    unique_rows = np.unique(a_2d, axis=0)
+    print(unique_rows)
+    # [[ 1  2  3  4]
+    #  [ 5  6  7  8]
+    #  [ 9 10 11 12]]
+
+    # To get the unique rows, index position, and occurrence count, you can use:
+    unique_rows, indices, occurrence_count = np.unique(
+        a_2d, axis=0, return_counts=True, return_index=True
+    )
+    print(unique_rows)
+    # [[ 1  2  3  4]
+    #  [ 5  6  7  8]
+    #  [ 9 10 11 12]]
+    print(indices)  # [0 1 2]
+    print(occurrence_count)  # [2 1 1]
+
+
+########################################################################################
+# Finding unique items without sorting                                                 #
+########################################################################################
+
+# `np.unique` sorts its input, which costs O(n log n). For integer keys you can instead
+# group equal values with a hash table, which costs O(n). The table below uses open
+# addressing: every key is hashed to a slot, and if that slot already holds a different
+# key, the key moves on to the next slot. All keys are probed at once, so each loop
+# iteration only handles the keys that collided in the previous one.
+#
+# Whole rows can be hashed the same way, by mixing the hashes of their columns, so the
+# `axis=0` variant doesn't need to lexsort the rows either.
+
+
+def hash_unique(a, axis=None, sort=False):
+    """Return the unique items of `a` with their first indices and counts.
+
+    Only integer keys are supported: floats would be truncated by the hash, and NaN,
+    which is never equal to itself, would keep probing forever.
+    """
+    if a.dtype.kind not in "biu":
+        raise TypeError(f"hash_unique() needs integer keys, not {a.dtype}")
+    if axis not in (None, 0):
+        raise ValueError(f"hash_unique() supports axis=None or axis=0, not {axis}")
+    # Each key is a row of `keys`: a single value, or a whole row of `a` flattened.
+    if axis is None:
+        keys = a.reshape(-1, 1)
+    else:
+        keys = a.reshape(len(a), math.prod(a.shape[1:]))
+    n = len(keys)
+    if n == 0:
+        uniques = a.reshape(-1) if axis is None else a
+        return uniques, np.empty(0, dtype=np.intp), np.empty(0, dtype=np.int64)
+    size = 1 << max(2 * n - 1, 1).bit_length()
+    mask = np.uint64(size - 1)
+
+    h = np.zeros(n, dtype=np.uint64)
+    for column in keys.astype(np.uint64).T:
+        h = (h ^ column) * np.uint64(0x9E3779B97F4A7C15)
+        h ^= h >> np.uint64(32)
+    h &= mask
+
+    owner = np.full(size, n)
+    slot_of = np.empty(n, dtype=np.int64)
+    pending = np.arange(n)
+    while len(pending):
+        slots = h[pending].astype(np.int64)
+        # Keys that land on an empty slot compete for it; the lowest index wins, which
+        # makes the owner of every slot the first occurrence of its key.
+        free = owner[slots] == n
+        np.minimum.at(owner, slots[free], pending[free])
+        found = (keys[owner[slots]] == keys[pending]).all(axis=1)
+        slot_of[pending[found]] = slots[found]
+        pending = pending[~found]
+        h[pending] = (h[pending] + np.uint64(1)) & mask
+
+    counts = np.bincount(slot_of, minlength=size)
+    is_first = np.zeros(n, dtype=bool)
+    is_first[owner[owner < n]] = True
+    indices = np.flatnonzero(is_first)
+    uniques = a.reshape(-1)[indices] if axis is None else a[indices]
+    counts = counts[slot_of[indices]]
+    if sort:
+        # Rows without columns are all equal, and `np.lexsort()` needs a column.
+        order = np.lexsort(keys[indices].T[::-1]) if keys.shape[1] else slice(None)
+        uniques, indices, counts = uniques[order], indices[order], counts[order]
+    return uniques, indices, counts
+
+
+@register("Finding unique items without sorting", needs=[unique_items_and_counts])
+def unique_without_sorting():
+    # Without `sort`, the unique items come out in the order in which they first appear.
+    unique_values_3, indices_list_1, occurrence_count_1 = hash_unique(a_14)
+    print(unique_values_3)  # [11 12 13 14 15 16 17 18 19 20]
+    print(indices_list_1)  # [ 0  2  3  4  5  6  7 12 13 14]
+    print(occurrence_count_1)  # [3 2 2 2 1 1 1 1 1 1]
+
+    unique_rows_1, indices_1, occurrence_count_2 = hash_unique(a_2d, axis=0, sort=True)
+    print(unique_rows_1)
+    # [[ 1  2  3  4]
+    #  [ 5  6  7  8]
+    #  [ 9 10 11 12]]
+    print(indices_1)  # [0 1 2]
+    print(occurrence_count_2)  # [2 1 1]
+
+
+########################################################################################
+# Reusing results for unchanged arrays                                                 #
+########################################################################################
+
+# `np.unique()` above is called on `a_14` three times and on `a_2d` twice. On large
+# arrays, you can avoid computing the same result again by remembering it under a
+# fingerprint of the array: a hash of its contents together with its shape, data type
+# and strides. Hashing only reads the array once, which is much cheaper than sorting it.
+#
+# Because the fingerprint is computed from the contents, writing to the array (also
+# through a view) changes the fingerprint, so a stale result is never returned. Results
+# that are no longer used are dropped, least recently used first, once the cache holds
+# more than `max_bytes` of them.
+#
+# Arrays of Python objects only hold pointers to their items, so hashing them says
+# nothing about the items themselves. They are rejected rather than cached.
+
+
+class ResultCache:
+    """Results of functions such as `np.unique`, keyed by the arrays they came from."""
+
+    def __init__(self, max_bytes=1 << 30):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+
+    @staticmethod
+    def fingerprint(a):
+        if a.dtype.hasobject:
+            raise TypeError("can't fingerprint arrays of Python objects")
+        digest = hashlib.blake2b(np.ascontiguousarray(a).view(np.uint8)).hexdigest()
+        return digest, a.shape, a.dtype.str, a.strides
+
+    def wrap(self, func):
+        """Return a version of `func` that reuses earlier results."""
+
+        def cached(a, *args, **kwargs):
+            # The function itself is part of the key, since different functions (such
+            # as lambdas) can share a name.
+            key = (func, self.fingerprint(a), args, tuple(sorted(kwargs.items())))
+            if key in self._results:
+                self.hits += 1
+                self._results.move_to_end(key)
+                return self._results[key]
+            self.misses += 1
+            result = func(a, *args, **kwargs)
+            arrays = result if isinstance(result, tuple) else (result,)
+            # The cached arrays are shared by every caller, so they are made read-only.
+            for array in arrays:
+                array.flags.writeable = False
+            self._results[key] = result
+            self.nbytes += sum(array.nbytes for array in arrays)
+            while self.nbytes > self.max_bytes and len(self._results) > 1:
+                _, evicted = self._results.popitem(last=False)
+                evicted = evicted if isinstance(evicted, tuple) else (evicted,)
+                self.nbytes -= sum(array.nbytes for array in evicted)
+            return result
+
+        return cached
+
+
+@register("Reusing results for unchanged arrays", needs=[unique_items_and_counts])
+def reusing_results():
+    cache_0 = ResultCache()
+    unique = cache_0.wrap(np.unique)
+    a_19 = a_14.copy()
+    print(unique(a_19))  # [11 12 13 14 15 16 17 18 19 20]
+    print(unique(a_19, return_counts=True)[1])  # [3 2 2 2 1 1 1 1 1 1]
+    print(unique(a_19))  # [11 12 13 14 15 16 17 18 19 20]
+    print(cache_0.hits, cache_0.misses)  # 1 2
+
+    # Writing through a view changes the contents, so the result is computed again.
+    b_14 = a_19[:1]
+    b_14[0] = 99
+    print(unique(a_19))  # [11 12 13 14 15 16 17 18 19 20 99]
+    print(cache_0.hits, cache_0.misses)  # 1 3
+
+    # Positional arguments are part of the key too, so this is computed separately.
+    print(unique(a_19, True)[1])  # [ 1  2  3  4  5  6  7 12 13 14  0]
+    print(cache_0.hits, cache_0.misses)  # 1 4
+
 
 ########################################################################################
 # Importing and exporting a CSV                                                        #
 ########################################################################################
-print("\nImporting and exporting a CSV\n")
-
-# It's simple to read in a CSV that contains existing information. The best and easiest
-# way to do this is to use Pandas.
-x_1 = pd.read_csv('music.csv', header=0).values
-print(x_1)
-
-# You can also simply select the columns you need:
-x_2 = pd.read_csv('music.csv', usecols=['Artist', 'Plays']).values
-print(x_2)
-
-# It's simple to use Pandas in order to export your array as well.
-a_15 = np.array([[-2.58289208,  0.43014843, -1.24082018, 1.59572603],
-                 [ 0.99027828, 1.17150989,  0.94125714, -0.14692469],
-                 [ 0.76989341,  0.81299683, -0.95068423, 0.11769564],
-                 [ 0.20484034,  0.34784527,  1.96979195, 0.51992837]])
-df = pd.DataFrame(a_15)
-print(df)
-#           0         1         2         3
-# 0 -2.582892  0.430148 -1.240820  1.595726
-# 1  0.990278  1.171510  0.941257 -0.146925
-# 2  0.769893  0.812997 -0.950684  0.117696
-# 3  0.204840  0.347845  1.969792  0.519928
-df.to_csv('pd.csv')
-print(pd.read_csv('pd.csv'))
-#    Unnamed: 0         0         1         2         3
-# 0           0 -2.582892  0.430148 -1.240820  1.595726
-# 1           1  0.990278  1.171510  0.941257 -0.146925
-# 2           2  0.769893  0.812997 -0.950684  0.117696
-# 3           3  0.204840  0.347845  1.969792  0.519928
-
-# You can also save your array with the NumPy `savetxt` method. Or you can open the file
-# `np.csv` any time with a text editor!
-np.savetxt('np.csv', a_15, fmt='%.2f', delimiter=',', header='1,  2,  3,  4')
+
+
+@register("Importing and exporting a CSV", pandas=True)
+def importing_and_exporting_csv():
+    global a_15, x_1  # pylint: disable=global-statement
+    # It's simple to read in a CSV that contains existing information. The best and
+    # easiest way to do this is to use Pandas.
+    x_1 = pd.read_csv("music.csv", header=0).values
+    print(x_1)
+
+    # You can also simply select the columns you need:
+    x_2 = pd.read_csv("music.csv", usecols=["Artist", "Plays"]).values
+    print(x_2)
+
+    # It's simple to use Pandas in order to export your array as well.
+    a_15 = np.array(
+        [
+            [-2.58289208, 0.43014843, -1.24082018, 1.59572603],
+            [0.99027828, 1.17150989, 0.94125714, -0.14692469],
+            [0.76989341, 0.81299683, -0.95068423, 0.11769564],
+            [0.20484034, 0.34784527, 1.96979195, 0.51992837],
+        ]
+    )
+    df = pd.DataFrame(a_15)
+    print(df)
+    #           0         1         2         3
+    # 0 -2.582892  0.430148 -1.240820  1.595726
+    # 1  0.990278  1.171510  0.941257 -0.146925
+    # 2  0.769893  0.812997 -0.950684  0.117696
+    # 3  0.204840  0.347845  1.969792  0.519928
+    df.to_csv("pd.csv")
+    print(pd.read_csv("pd.csv"))
+    #    Unnamed: 0         0         1         2         3
+    # 0           0 -2.582892  0.430148 -1.240820  1.595726
+    # 1           1  0.990278  1.171510  0.941257 -0.146925
+    # 2           2  0.769893  0.812997 -0.950684  0.117696
+    # 3           3  0.204840  0.347845  1.969792  0.519928
+
+    # You can also save your array with the NumPy `savetxt` method. Or you can open the
+    # file `np.csv` any time with a text editor!
+    np.savetxt("np.csv", a_15, fmt="%.2f", delimiter=",", header="1,  2,  3,  4")
+
+
+########################################################################################
+# Streaming a large CSV in chunks                                                      #
+########################################################################################
+
+# `pd.read_csv(...).values` materializes the whole file as an array of Python objects.
+# For files that don't fit in memory, you can pass `chunksize` to parse the file once,
+# in fixed-size batches, so that peak memory is bounded by the chunk size rather than
+# the file size. Passing `usecols` and `dtype` pushes the column projection and the
+# type conversion into the parser itself.
+#
+# To end up with typed NumPy record batches instead of object arrays, text columns are
+# dictionary-encoded: every artist, for example, is replaced by an `int32` code into a
+# table of unique names that grows as new names show up in later chunks.
+
+
+def read_csv_batches(path, usecols, chunksize, text_columns=()):
+    """Yield typed record batches of a CSV file, with the tables of the text columns.
+
+    Text columns are stored as `int32` codes into their table, every other column as
+    `int64`. The tables are the same lists in every step, growing as needed. Missing
+    text cells get a code of their own, for `None`.
+    """
+    fields = [(c, np.int32 if c in text_columns else np.int64) for c in usecols]
+    record_dtype = np.dtype(fields)
+    codes = {column: {} for column in text_columns}
+    tables = {column: [] for column in text_columns}
+    for chunk in pd.read_csv(
+        path,
+        usecols=usecols,
+        dtype={c: str if c in text_columns else np.int64 for c in usecols},
+        chunksize=chunksize,
+    ):
+        batch = np.empty(len(chunk), dtype=record_dtype)
+        for column in usecols:
+            if column not in text_columns:
+                batch[column] = chunk[column].to_numpy()
+                continue
+            # `pd.factorize` encodes the chunk against its own uniques, so only those
+            # (and not every row) have to be looked up in the table of the column.
+            # Missing cells would otherwise get the code -1, which picks the last entry.
+            chunk_codes, chunk_uniques = pd.factorize(
+                chunk[column], use_na_sentinel=False
+            )
+            chunk_uniques = [None if pd.isna(v) else v for v in chunk_uniques]
+            for name in chunk_uniques:
+                if name not in codes[column]:
+                    codes[column][name] = len(tables[column])
+                    tables[column].append(name)
+            to_table = np.array(
+                [codes[column][name] for name in chunk_uniques], dtype=np.int32
+            )
+            batch[column] = to_table[chunk_codes]
+        yield batch, tables
+
+
+@register("Streaming a large CSV in chunks", pandas=True)
+def streaming_csv():
+    for batch, tables in read_csv_batches(
+        "music.csv", ["Artist", "Plays"], chunksize=2, text_columns=["Artist"]
+    ):
+        print(batch)
+    # [(0, 27000000) (1, 70000000)]
+    # [(2, 48000000) (3, 74000000)]
+
+    # The codes can be turned back into names through the table.
+    print(np.array(tables["Artist"])[batch["Artist"]])  # ['Miles Davis' 'SIA']
+
+    # A blank text cell is missing, and is coded as `None` rather than as another name.
+    csv_0 = io.StringIO("Artist,Plays\nA,1\n,2\nB,3\n")
+    batch, tables = next(read_csv_batches(csv_0, ["Artist", "Plays"], 3, ["Artist"]))
+    print(batch["Artist"], tables["Artist"])  # [0 1 2] ['A', None, 'B']
+
+
+########################################################################################
+# Storing text columns as codes                                                        #
+########################################################################################
+
+# In the object array returned by `pd.read_csv(...).values`, every cell of a text
+# column such as `Genre` is a pointer to a Python string of its own. A column with only
+# a few distinct values can be stored much more compactly as a table of those values
+# plus one `int32` code per row. Comparing and grouping then work on the codes, at the
+# speed of integers.
+
+
+class Categorical:
+    """A column of strings stored as `int32` codes into a table of unique values."""
+
+    def __init__(self, categories, codes):
+        self.categories = np.asarray(categories, dtype=str)
+        self.codes = np.asarray(codes, dtype=np.int32)
+        # Pandas codes missing cells as -1, which would index the last category.
+        if (self.codes < 0).any():
+            raise ValueError("Categorical doesn't support missing values")
+
+    @classmethod
+    def from_values(cls, values):
+        categories, codes = np.unique(values, return_inverse=True)
+        return cls(categories, codes)
+
+    @classmethod
+    def read_csv(cls, path, column):
+        # Pandas can encode the column while it parses the file, so the strings are
+        # never created one per row.
+        values = pd.read_csv(path, usecols=[column], dtype={column: "category"})[column]
+        return cls(values.cat.categories, values.cat.codes)
+
+    def to_csv(self, path, column):
+        values = pd.Categorical.from_codes(self.codes, self.categories)
+        pd.DataFrame({column: values}).to_csv(path, index=False)
+
+    def to_values(self):
+        return self.categories[self.codes]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __eq__(self, value):
+        # A value that isn't in the table gets the code -1, which matches no row.
+        code = np.flatnonzero(self.categories == value)
+        return self.codes == (code[0] if len(code) else -1)
+
+    def count(self):
+        """Count the rows of every category."""
+        return np.bincount(self.codes, minlength=len(self.categories))
+
+    def sum(self, values):
+        """Sum `values` over the rows of every category."""
+        return np.bincount(self.codes, weights=values, minlength=len(self.categories))
+
+
+@register(
+    "Storing text columns as codes", needs=[importing_and_exporting_csv], pandas=True
+)
+def text_columns_as_codes():
+    genre_0 = Categorical.read_csv("music.csv", "Genre")
+    print(genre_0.categories)  # ['Jazz' 'Pop' 'Rock']
+    print(genre_0.codes)  # [0 2 0 1]
+    print(genre_0 == "Jazz")  # [ True False  True False]
+    print(x_1[genre_0 == "Jazz", 0])  # ['Billie Holiday' 'Miles Davis']
+    print(genre_0.count())  # [2 1 1]
+    print(genre_0.sum(x_1[:, 3].astype(np.int64)))  # [75000000. 74000000. 70000000.]
+
+    # Each object cell costs an 8-byte pointer plus the string it points to, while each
+    # code costs 4 bytes; the table of categories is only paid once per column.
+    print(sys.getsizeof(x_1[0, 1]) + x_1.itemsize, genre_0.codes.itemsize)  # 61 4
+
+    # The codes survive a round trip through a CSV file.
+    genre_0.to_csv("genre.csv", "Genre")
+    genre_1 = Categorical.read_csv("genre.csv", "Genre")
+    print(np.array_equal(genre_1.to_values(), x_1[:, 1].astype(str)))  # True
+    print(np.array_equal(Categorical.from_values(x_1[:, 1]).codes, genre_0.codes))
+    # True
+
+
+########################################################################################
+# Aggregating values per key                                                           #
+########################################################################################
+
+# To aggregate values per key, such as the plays per genre, each row first needs the
+# number of its group. With several key columns, every column is encoded on its own and
+# the codes are combined into a single integer, which `np.unique(...,
+# return_inverse=True)` then turns into group numbers. With those, `np.bincount()` sums
+# and counts every group in one pass, and `ufunc.reduceat()` finds the minima and maxima
+# of the rows once they are sorted by group.
+#
+# The aggregates are kept as running totals, so the rows can also arrive in chunks.
+# Means and standard deviations are merged with the pairwise update of Chan et al.: each
+# part contributes its count, mean and sum of squared deviations (`m2`). The same update
+# is used by `blocked_reduce()` and `Stats` further below.
+
+
+def merge_moments(count_a, mean_a, m2_a, count_b, mean_b, m2_b):
+    """Merge the counts, means and `m2` of two sets of values (or arrays of sets)."""
+    count = count_a + count_b
+    share = np.where(count > 0, count_b / np.maximum(count, 1), 0)
+    delta = mean_b - mean_a
+    mean = mean_a + delta * share
+    m2 = m2_a + m2_b + delta**2 * count_a * share
+    return count, mean, m2
+
+
+class GroupBy:
+    """Sums, counts, minima, maxima, means and standard deviations per key."""
+
+    # The starting value of every aggregate for a newly seen group.
+    _FILLS = {"count": 0, "sum": 0, "min": np.inf, "max": -np.inf, "mean": 0, "_m2": 0}
+
+    def __init__(self):
+        self.groups = {}
+        self.count = np.zeros(0, dtype=np.int64)
+        self.sum = np.zeros(0)
+        self.min = np.zeros(0)
+        self.max = np.zeros(0)
+        self.mean = np.zeros(0)
+        self._m2 = np.zeros(0)
+
+    @property
+    def keys(self):
+        return list(self.groups)
+
+    @property
+    def std(self):
+        return np.sqrt(self._m2 / self.count)
+
+    def update(self, keys, values):
+        """Add rows, given as a list of key columns and a column of values."""
+        values = np.asarray(values, dtype=float)
+        # A chunk without rows, for example after filtering, changes nothing.
+        if not len(values):
+            return
+        # Missing keys (NaN or None) form a group of their own rather than getting the
+        # code -1, which `np.ravel_multi_index()` would reject.
+        codes, uniques = zip(
+            *(
+                pd.factorize(np.asarray(column), use_na_sentinel=False)
+                for column in keys
+            )
+        )
+        combined = np.ravel_multi_index(codes, [len(u) for u in uniques])
+        _, first, inverse = np.unique(combined, return_index=True, return_inverse=True)
+
+        # Only the groups of this chunk are looked up in the table of all groups.
+        # NaN is never equal to itself, so every missing key is looked up as None.
+        names = zip(
+            *(
+                [None if pd.isna(v) else v for v in np.asarray(column)[first].tolist()]
+                for column in keys
+            )
+        )
+        ids = np.array([self.groups.setdefault(n, len(self.groups)) for n in names])
+        grow = len(self.groups) - len(self.count)
+        for name, fill in self._FILLS.items():
+            a = getattr(self, name)
+            setattr(self, name, np.concatenate((a, np.full(grow, fill, dtype=a.dtype))))
+
+        count = np.bincount(inverse)
+        total = np.bincount(inverse, weights=values)
+        mean = total / count
+        m2 = np.bincount(inverse, weights=(values - mean[inverse]) ** 2)
+        order = np.argsort(inverse, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(count)[:-1]))
+
+        self.count[ids], self.mean[ids], self._m2[ids] = merge_moments(
+            self.count[ids], self.mean[ids], self._m2[ids], count, mean, m2
+        )
+        self.sum[ids] += total
+        low = np.minimum.reduceat(values[order], starts)
+        high = np.maximum.reduceat(values[order], starts)
+        self.min[ids] = np.minimum(self.min[ids], low)
+        self.max[ids] = np.maximum(self.max[ids], high)
+
+
+@register(
+    "Aggregating values per key", needs=[importing_and_exporting_csv], pandas=True
+)
+def aggregating_per_key():
+    plays_per_genre = GroupBy()
+    for chunk in pd.read_csv("music.csv", usecols=["Genre", "Plays"], chunksize=3):
+        plays_per_genre.update([chunk["Genre"]], chunk["Plays"])
+    print(plays_per_genre.keys)  # [('Jazz',), ('Rock',), ('Pop',)]
+    print(plays_per_genre.count)  # [2 1 1]
+    print(plays_per_genre.sum)  # [75000000. 70000000. 74000000.]
+    print(plays_per_genre.min)  # [27000000. 70000000. 74000000.]
+    print(plays_per_genre.mean)  # [37500000. 70000000. 74000000.]
+    print(plays_per_genre.std)  # [10500000.        0.        0.]
+
+    # A chunk without rows, such as one where a filter matched nothing, is skipped.
+    plays_per_genre.update([np.array([], dtype=object)], [])
+    print(plays_per_genre.count)  # [2 1 1]
+
+    # Several key columns are grouped on the combination of their values.
+    listeners_per_group = GroupBy()
+    listeners_per_group.update([x_1[:, 1], x_1[:, 3] > 5e7], x_1[:, 2])
+    print(listeners_per_group.keys)
+    # [('Jazz', False), ('Rock', True), ('Pop', True)]
+    print(listeners_per_group.max)  # [1500000. 2700000. 2000000.]
+
+
+########################################################################################
+# Saving columns as memory-mapped binary files                                         #
+########################################################################################
+
+
+@register("Saving columns as memory-mapped binary files", needs=[more_operations])
+def memory_mapped_columns():
+    # Writing an array as text means formatting every float on export and parsing it
+    # again on import, and a format such as `fmt='%.2f'` even throws away digits. If the
+    # data only needs to be read back by NumPy, you can instead store each column in its
+    # own `.npy` file and describe them in a small JSON manifest.
+    store = pathlib.Path("np_columns")
+    store.mkdir(exist_ok=True)
+    manifest = {"shape": list(a_13.shape), "dtype": a_13.dtype.str, "columns": []}
+    for i in range(a_13.shape[1]):
+        np.save(store / f"{i}.npy", a_13[:, i])
+        manifest["columns"].append(f"{i}.npy")
+    (store / "manifest.json").write_text(json.dumps(manifest))
+
+    # Opening the files with `mmap_mode` maps them into memory instead of reading them,
+    # so a reload costs neither parsing nor copying: pages are only loaded when they are
+    # used.
+    manifest = json.loads((store / "manifest.json").read_text())
+    columns = [np.load(store / name, mmap_mode="r") for name in manifest["columns"]]
+    print(type(columns[0]))  # <class 'numpy.memmap'>
+    print(columns[0])  # [0.45053314 0.54627315 0.12697628]
+
+    # Unlike text written with `%.2f`, the binary files round-trip exactly.
+    text = io.StringIO()
+    np.savetxt(text, a_13, fmt="%.2f", delimiter=",")
+    text.seek(0)
+    print(np.array_equal(np.column_stack(columns), a_13))  # True
+    print(np.array_equal(np.loadtxt(text, delimiter=","), a_13))  # False
+
+
+########################################################################################
+# Writing large CSV files quickly                                                      #
+########################################################################################
+
+# When a CSV file is needed after all, most of the time goes into turning numbers into
+# text one value at a time. Converting a whole column with `astype(str)` does that in a
+# single NumPy call, and uses the shortest text that reads back as exactly the same
+# number. The text of every row is then joined into a line, and every chunk of lines
+# is written with one call into a large buffer.
+#
+# Only numbers are written, since they never need to be quoted. Text that may contain
+# commas, quotes or line breaks is better left to `DataFrame.to_csv()`.
+#
+# The input can be a single array, which is written `rows` rows at a time, or any
+# iterable of row chunks, such as a generator. Either way, only the text of one chunk
+# exists at a time, so memory use doesn't grow with the size of the file. The output
+# can also be compressed on the fly.
+
+COMPRESSIONS = {"gzip": gzip, "bz2": bz2, "xz": lzma}
+
+
+def write_csv(
+    path, chunks, header=None, compression=None, buffer_size=1 << 20, rows=1 << 16
+):
+    """Write a 2D array, or an iterable of 2D row chunks, to a CSV file."""
+    if isinstance(chunks, np.ndarray):
+        array = chunks
+        chunks = (array[i : i + rows] for i in range(0, len(array), rows))
+    if compression is None:
+        opener, kwargs = open, {"buffering": buffer_size}
+    else:
+        opener, kwargs = COMPRESSIONS[compression].open, {}
+    with opener(path, "wt", encoding="utf-8", **kwargs) as f:
+        if header is not None:
+            f.write(",".join(header) + "\n")
+        for chunk in chunks:
+            if chunk.dtype.kind not in "biuf":
+                raise TypeError(f"write_csv() only writes numbers, not {chunk.dtype}")
+            # An empty chunk would otherwise be written as a blank line.
+            if not len(chunk):
+                continue
+            lines = map(",".join, chunk.astype(str).tolist())
+            f.write("\n".join(lines) + "\n")
+
+
+@register(
+    "Writing large CSV files quickly", needs=[importing_and_exporting_csv], pandas=True
+)
+def writing_csv():
+    header_0 = ["0", "1", "2", "3"]
+    write_csv("fast.csv", (rows for rows in np.array_split(a_15, 2)), header=header_0)
+    print(pathlib.Path("fast.csv").read_text().splitlines()[:2])
+    # ['0,1,2,3', '-2.58289208,0.43014843,-1.24082018,1.59572603']
+    print(np.array_equal(np.loadtxt("fast.csv", delimiter=",", skiprows=1), a_15))
+    # True
+
+    write_csv("fast.csv.gz", a_15, header=header_0, compression="gzip", rows=2)
+    print(np.array_equal(pd.read_csv("fast.csv.gz").values, a_15))  # True
+
+    try:
+        write_csv("fast.csv", np.array([["a,b", "c"]]))
+    except TypeError as error:
+        print(error)  # write_csv() only writes numbers, not <U3
+
+
+########################################################################################
+# Aggregating arrays larger than memory                                                #
+########################################################################################
+
+# A memory-mapped array can be much larger than the available memory, but calling
+# `sum()` or `min()` on it directly still has to bring all of it in. You can instead
+# walk over it in blocks of rows small enough to stay in cache, reduce each block, and
+# merge the partial results.
+
+
+def blocked_reduce(a, op, axis=None, block_bytes=1 << 20):
+    """Compute `op` ("sum", "min", "max", "mean" or "std") of a 2D array by blocks."""
+    if axis is not None:
+        axis = np.lib.array_utils.normalize_axis_index(axis, a.ndim)
+    # Without any values, there is nothing to stream, and NumPy gives the exact result
+    # (or error) for the empty array.
+    if a.size == 0 and (op in ("mean", "std") or axis == 1):
+        return getattr(np, op)(a, axis=axis)
+    # The size of a row is counted from its elements rather than from the strides,
+    # which only span a row in C order.
+    step = max(1, block_bytes // max(a.itemsize * math.prod(a.shape[1:]), 1))
+    blocks = (a[start : start + step] for start in range(0, len(a), step))
+
+    # Rows don't depend on each other, so their results are simply concatenated.
+    if axis == 1:
+        return np.concatenate([getattr(np, op)(block, axis=1) for block in blocks])
+
+    if op in ("sum", "min", "max"):
+        ufunc = {"sum": np.add, "min": np.minimum, "max": np.maximum}[op]
+        # Reducing no rows gives the identity of the ufunc, if it has one.
+        result = ufunc.reduce(a[:0], axis=axis) if ufunc.identity is not None else None
+        for block in blocks:
+            partial = ufunc.reduce(block, axis=axis)
+            result = partial if result is None else ufunc(result, partial)
+        return result if result is not None else getattr(np, op)(a, axis=axis)
+
+    # Means and variances are merged with `merge_moments()`: each block contributes its
+    # count, mean and sum of squared deviations.
+    count, mean, m2 = 0, 0.0, 0.0
+    for block in blocks:
+        block_count = block.size if axis is None else len(block)
+        block_mean = block.mean(axis=axis)
+        block_m2 = ((block - block_mean) ** 2).sum(axis=axis)
+        count, mean, m2 = merge_moments(
+            count, mean, m2, block_count, block_mean, block_m2
+        )
+    return mean if op == "mean" else np.sqrt(m2 / count)
+
+
+@register(
+    "Aggregating arrays larger than memory", needs=[more_operations, creating_matrices]
+)
+def out_of_core_aggregation():
+    a_16 = np.lib.format.open_memmap(
+        "a_13.npy", mode="w+", dtype=a_13.dtype, shape=a_13.shape
+    )
+    a_16[:] = a_13
+    a_16.flush()
+
+    # The results match the in-memory aggregations, even with one row per block.
+    a_17 = np.load("a_13.npy", mmap_mode="r")
+    print(blocked_reduce(a_17, "sum", block_bytes=32))  # 4.8595784
+    print(blocked_reduce(a_17, "min", axis=0, block_bytes=32))
+    # [0.12697628 0.05093587 0.26590556 0.5510652 ]
+    print(np.allclose(blocked_reduce(a_17, "mean", block_bytes=32), a_13.mean()))
+    # True
+    b_7 = blocked_reduce(a_17, "std", axis=0, block_bytes=32)
+    print(np.allclose(b_7, a_13.std(axis=0)))  # True
+    print(blocked_reduce(data_5, "max", axis=1, block_bytes=16))  # [2 5 6]
+
+
+########################################################################################
+# Using several cores at once                                                          #
+########################################################################################
+
+# NumPy runs each operation on a single core, but it releases the GIL inside its loops
+# over numeric data. That means you can split a large array into chunks along the first
+# axis and let a pool of threads work on the chunks at the same time, each writing into
+# its own slice of a shared output array.
+
+
+def _chunks(length, workers):
+    bounds = np.linspace(0, length, min(workers, max(length, 1)) + 1).astype(int)
+    return [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def parallel_ufunc(ufunc, a, b, workers=None):
+    """Apply a binary ufunc such as `np.add` to `a` and `b` on several threads."""
+    shape = np.broadcast_shapes(np.shape(a), np.shape(b))
+    if not shape:
+        return ufunc(a, b)
+    # Scalars are passed on as they are, so that NumPy promotes them by its usual rules
+    # (`float32` plus a Python float stays `float32`), and so is the output dtype.
+    a, b = (np.broadcast_to(x, shape) if np.ndim(x) else x for x in (a, b))
+    empty = [x[:0] if np.ndim(x) else x for x in (a, b)]
+    out = np.empty(shape, dtype=ufunc(*empty).dtype)
+
+    def apply(chunk):
+        ufunc(*(x[chunk] if np.ndim(x) else x for x in (a, b)), out=out[chunk])
+
+    workers = workers or os.cpu_count()
+    with futures.ThreadPoolExecutor(workers) as pool:
+        list(pool.map(apply, _chunks(shape[0], workers)))
+    return out
+
+
+def parallel_reduce(ufunc, a, axis=None, workers=None):
+    """Reduce `a` with a ufunc such as `np.add` or `np.minimum` on several threads."""
+    if axis is not None:
+        axis = np.lib.array_utils.normalize_axis_index(axis, a.ndim)
+    workers = workers or os.cpu_count()
+    with futures.ThreadPoolExecutor(workers) as pool:
+        partials = list(
+            pool.map(
+                lambda chunk: ufunc.reduce(a[chunk], axis=axis),
+                _chunks(len(a), workers),
+            )
+        )
+    # Reducing along the first axis leaves one partial result per chunk to be merged,
+    # while reducing along any other axis leaves the chunks independent of each other.
+    if axis is None or axis == 0:
+        return ufunc.reduce(np.array(partials), axis=0)
+    return np.concatenate(partials)
+
+
+@register("Using several cores at once", needs=[basic_operations, more_operations])
+def several_cores():
+    print(parallel_ufunc(np.add, data_1, ones, workers=2))  # [2 3]
+    print(parallel_reduce(np.add, a_12, workers=2))  # 10
+    print(parallel_reduce(np.add, b_6, axis=0, workers=2))  # [3 3]
+    print(parallel_reduce(np.add, b_6, axis=1, workers=2))  # [2 4]
+    print(parallel_reduce(np.minimum, a_13, axis=0, workers=2))
+    # [0.12697628 0.05093587 0.26590556 0.5510652 ]
+
+
+########################################################################################
+# Sorting arrays larger than memory                                                    #
+########################################################################################
+
+# `np.sort()` needs the whole array in memory. To sort a memory-mapped array that is
+# larger than that, you can first sort chunks that fit (on several threads, since they
+# are independent) into "runs", and then merge the sorted runs into the output.
+#
+# The merge works on blocks instead of single elements: it loads the next block of
+# every run, and every loaded value up to the smallest of the blocks' last values can
+# safely be written out, because everything still left in the runs is at least as big.
+
+
+def external_sort(a, out, run_size=1 << 20, block_size=1 << 16, workers=None):
+    """Sort the 1D array `a` into `out` using memory for only a few runs at a time."""
+    starts = list(range(0, len(a), run_size))
+    with tempfile.TemporaryFile() as f:
+        runs = np.memmap(f, dtype=a.dtype, shape=a.shape)
+
+        def sort_run(start):
+            runs[start : start + run_size] = np.sort(a[start : start + run_size])
+
+        with futures.ThreadPoolExecutor(workers or os.cpu_count()) as pool:
+            list(pool.map(sort_run, starts))
+
+        positions = list(starts)
+        ends = [min(start + run_size, len(a)) for start in starts]
+        written = 0
+        while written < len(a):
+            blocks = [
+                runs[position : min(position + block_size, end)]
+                for position, end in zip(positions, ends)
+            ]
+            # Like `np.sort()`, the runs put NaN last, so NaN counts as the largest
+            # value here as well. `min()` could return it as the smallest one.
+            threshold = np.sort([block[-1] for block in blocks if len(block)])[0]
+            taken = [np.searchsorted(b, threshold, side="right") for b in blocks]
+            merged = np.sort(np.concatenate([b[:n] for b, n in zip(blocks, taken)]))
+            out[written : written + len(merged)] = merged
+            written += len(merged)
+            positions = [position + n for position, n in zip(positions, taken)]
+    return out
+
+
+# Often only the largest values are needed. `np.partition()` moves the k largest values
+# to the end of an array without sorting the rest, so the top k of a large array can be
+# collected chunk by chunk while keeping only k candidates in memory.
+
+
+def top_k(a, k, chunk_size=1 << 20):
+    """Return the k largest values of `a`, largest first."""
+    best = a[:0]
+    if k <= 0:
+        return best
+    for start in range(0, len(a), chunk_size):
+        candidates = np.concatenate((best, a[start : start + chunk_size]))
+        best = np.partition(candidates, -k)[-k:] if len(candidates) > k else candidates
+    return np.sort(best)[::-1]
+
+
+# Quantiles don't need a sort either. A first pass counts how many values fall into
+# each of a number of equally wide bins, which tells which bin holds the value of the
+# wanted rank, and a second pass only keeps the values of that bin.
+
+
+def quantile(a, q, chunk_size=1 << 20, bins=1024):
+    """Return the value of rank `q * (len(a) - 1)`, rounded down, without sorting."""
+    chunks = [a[start : start + chunk_size] for start in range(0, len(a), chunk_size)]
+    low = min(chunk.min() for chunk in chunks)
+    high = max(chunk.max() for chunk in chunks)
+    edges = np.linspace(low, high, bins + 1)
+
+    def bin_of(chunk):
+        return np.clip(np.searchsorted(edges, chunk, side="right") - 1, 0, bins - 1)
+
+    counts = sum(np.bincount(bin_of(chunk), minlength=bins) for chunk in chunks)
+    rank = int(q * (len(a) - 1))
+    cumulative = np.cumsum(counts)
+    target = np.searchsorted(cumulative, rank, side="right")
+    below = cumulative[target - 1] if target else 0
+    selected = np.concatenate([chunk[bin_of(chunk) == target] for chunk in chunks])
+    return np.partition(selected, rank - below)[rank - below]
+
+
+@register("Sorting arrays larger than memory")
+def out_of_core_sorting():
+    a_18 = np.lib.format.open_memmap("plays.npy", mode="w+", dtype=np.int64, shape=(8,))
+    a_18[:] = [2, 1, 5, 3, 7, 4, 6, 8]
+    b_13 = np.lib.format.open_memmap(
+        "plays_sorted.npy", mode="w+", dtype=a_18.dtype, shape=a_18.shape
+    )
+    print(external_sort(a_18, b_13, run_size=3, block_size=2))  # [1 2 3 4 5 6 7 8]
+
+    # As with `np.sort()`, NaN ends up last.
+    a_21 = np.array([1.0, np.nan, 2, 3, 4, 5])
+    print(external_sort(a_21, np.empty_like(a_21), run_size=2, block_size=1))
+    # [ 1.  2.  3.  4.  5. nan]
+
+    print(top_k(a_18, 3, chunk_size=3), top_k(a_18, 0))  # [8 7 6] []
+
+    print(quantile(a_18, 0.5, chunk_size=3))  # 4
+    print(np.quantile(a_18, 0.5, method="lower"))  # 4
+
+
+########################################################################################
+# Aggregating in pieces and merging the results                                        #
+########################################################################################
+
+# When the data is spread over several machines or processes, each of them can compute
+# partial aggregates of its own share, and only those small partial results need to be
+# sent on and merged. The accumulators below can be updated batch by batch, merged with
+# each other, and pickled into a compact binary form made of `np.save()` records.
+#
+# Like `a_13.min(axis=0)`, `Stats` aggregates along the first axis of its batches, so
+# 1D batches give single numbers and 2D batches give one result per column.
+
+
+class Stats:
+    """Running count, sum, min, max, mean and variance along the first axis."""
+
+    def __init__(self, shape=()):
+        self.count = 0
+        self.sum = np.zeros(shape)
+        self.min = np.full(shape, np.inf)
+        self.max = np.full(shape, -np.inf)
+        self.mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+
+    @property
+    def var(self):
+        return self._m2 / self.count
+
+    def update(self, batch):
+        # Integers are summed as integers, which stay exact beyond 2**53.
+        batch = np.asarray(batch)
+        if batch.dtype.kind not in "biu":
+            batch = batch.astype(float)
+        if not len(batch):
+            return self
+        other = Stats(batch.shape[1:])
+        other.count = len(batch)
+        other.sum = batch.sum(axis=0)
+        other.min = batch.min(axis=0)
+        other.max = batch.max(axis=0)
+        other.mean = other.sum / other.count
+        other._m2 = ((batch - other.mean) ** 2).sum(axis=0)
+        return self.merge(other)
+
+    def merge(self, other):
+        # An empty side has no mean to weigh, and no minimum or maximum to compare.
+        if not other.count:
+            return self
+        # An empty accumulator takes on the data types of the first values it sees.
+        if not self.count:
+            self.sum, self.min, self.max = other.sum, other.min, other.max
+        else:
+            self.sum = self.sum + other.sum
+            self.min = np.minimum(self.min, other.min)
+            self.max = np.maximum(self.max, other.max)
+        self.count, self.mean, self._m2 = merge_moments(
+            self.count, self.mean, self._m2, other.count, other.mean, other._m2
+        )
+        return self
+
+    def to_bytes(self):
+        # The sum, minimum and maximum are saved one by one to keep their data types.
+        buffer = io.BytesIO()
+        np.save(buffer, self.count)
+        for a in (self.sum, self.min, self.max):
+            np.save(buffer, a)
+        np.save(buffer, np.stack([self.mean, self._m2]))
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        buffer = io.BytesIO(data)
+        count = int(np.load(buffer))
+        total, low, high = np.load(buffer), np.load(buffer), np.load(buffer)
+        stats = cls(total.shape)
+        stats.count = count
+        stats.sum, stats.min, stats.max = total, low, high
+        stats.mean, stats._m2 = np.load(buffer)
+        return stats
+
+    def __reduce__(self):
+        return self.from_bytes, (self.to_bytes(),)
+
+
+class UniqueCounts:
+    """Running counts of the unique values seen so far."""
+
+    def __init__(self, values=(), counts=()):
+        self.values = np.asarray(values)
+        self.counts = np.asarray(counts, dtype=np.int64)
+
+    def update(self, batch):
+        return self.merge(UniqueCounts(*np.unique(batch, return_counts=True)))
+
+    def merge(self, other):
+        # An empty accumulator takes on the data type of the first values it sees, and
+        # merging an empty one leaves the data type of the values unchanged.
+        if not len(other.values):
+            return self
+        values = other.values
+        if len(self.values):
+            values = np.concatenate((self.values, values))
+        self.values, inverse = np.unique(values, return_inverse=True)
+        # `np.bincount()` would add the counts as floats, which aren't exact beyond
+        # 2**53, so they are added as integers instead.
+        counts = np.concatenate((self.counts, other.counts))
+        self.counts = np.zeros(len(self.values), dtype=np.int64)
+        np.add.at(self.counts, inverse, counts)
+        return self
+
+    def to_bytes(self):
+        buffer = io.BytesIO()
+        np.save(buffer, self.values)
+        np.save(buffer, self.counts)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        buffer = io.BytesIO(data)
+        return cls(np.load(buffer), np.load(buffer))
+
+    def __reduce__(self):
+        return self.from_bytes, (self.to_bytes(),)
+
+
+@register(
+    "Aggregating in pieces and merging the results",
+    needs=[more_operations, unique_items_and_counts],
+)
+def aggregating_in_pieces():
+    # Three "workers" each aggregate a shard of `a_14` and send their pickled results to
+    # a "coordinator", which merges them.
+    shards_0 = [
+        pickle.dumps(Stats().update(shard)) for shard in np.array_split(a_14, 3)
+    ]
+    stats_0 = Stats()
+    for shard in shards_0:
+        stats_0.merge(pickle.loads(shard))
+    print(stats_0.count, stats_0.sum, stats_0.min, stats_0.max)  # 15 216 11 20
+    print(np.isclose(stats_0.mean, a_14.mean()), np.isclose(stats_0.var, a_14.var()))
+    # True True
+
+    shards_1 = [pickle.dumps(UniqueCounts().update(s)) for s in np.array_split(a_14, 3)]
+    unique_counts_0 = UniqueCounts()
+    for shard in shards_1:
+        unique_counts_0.merge(pickle.loads(shard))
+    print(unique_counts_0.values)  # [11 12 13 14 15 16 17 18 19 20]
+    print(unique_counts_0.counts)  # [3 2 2 2 1 1 1 1 1 1]
+
+    # Merging empty aggregates changes nothing.
+    print(unique_counts_0.merge(UniqueCounts()).values.dtype)  # int64
+    print(Stats().merge(Stats()).count, stats_0.merge(Stats()).count)  # 0 15
+
+    # Integer sums and counts stay exact, even where floats can't hold every integer.
+    print(Stats().update(np.array([2**53, 1, 0])).sum)  # 9007199254740993
+    print(UniqueCounts([7], [2**53]).merge(UniqueCounts([7], [1])).counts)
+    # [9007199254740993]
+
+    # With 2D batches, the aggregates are computed per column.
+    stats_1 = Stats(a_13.shape[1:])
+    for row in np.array_split(a_13, 3):
+        stats_1.update(row)
+    print(stats_1.min)  # [0.12697628 0.05093587 0.26590556 0.5510652 ]
+
+
+########################################################################################
+# Sharing arrays between processes                                                     #
+########################################################################################
+
+# Threads share memory, but processes don't: an array sent to a process pool is
+# pickled and copied into every worker. With `multiprocessing.shared_memory`, you can
+# instead put the array into a block of memory that other processes attach to by name,
+# and wrap that block in an ndarray without copying anything. The shape and data type
+# are stored in a small header at the start of the block, so the name is all a worker
+# needs. Like in a `.npy` file, the data type is written with
+# `np.lib.format.dtype_to_descr()`, which keeps the fields of structured arrays.
+#
+# The registry below unlinks every block it created when it is closed, even if an
+# exception is raised. If the whole process crashes, Python's resource tracker removes
+# the blocks instead. Its reference counts only count the holds taken in the process
+# that published the arrays: workers that attach to a block don't take one, so the
+# publisher has to hold on to a block until its workers are done with it.
+#
+# Arrays of Python objects only hold pointers into the memory of their own process,
+# which mean nothing to another process, so they can't be published.
+
+
+class SharedArrays:
+    """Arrays published in shared memory, and released once nobody needs them."""
+
+    HEADER = 256
+
+    def __init__(self):
+        self._segments = {}
+        self._references = {}
+
+    def publish(self, name, array):
+        """Copy `array` into shared memory and return the name workers attach to."""
+        if array.dtype.hasobject:
+            raise TypeError("can't share arrays of Python objects between processes")
+        descr = np.lib.format.dtype_to_descr(array.dtype)
+        header = repr({"shape": array.shape, "descr": descr}).encode()
+        if len(header) > self.HEADER:
+            raise ValueError(
+                f"the header of {name} takes {len(header)} bytes, "
+                f"more than {self.HEADER}"
+            )
+        segment = shared_memory.SharedMemory(
+            name=f"{name}-{os.getpid()}", create=True, size=self.HEADER + array.nbytes
+        )
+        segment.buf[: len(header)] = header
+        view = np.ndarray(array.shape, array.dtype, segment.buf, offset=self.HEADER)
+        view[...] = array
+        self._segments[segment.name] = segment
+        self._references[segment.name] = 1
+        return segment.name
+
+    def acquire(self, name):
+        """Hold a published block once more, in the publishing process."""
+        self._references[name] += 1
+
+    def release(self, name):
+        """Drop one hold of a block, and unlink the block once none are left."""
+        self._references[name] -= 1
+        if not self._references[name]:
+            del self._references[name]
+            segment = self._segments.pop(name)
+            segment.close()
+            segment.unlink()
+
+    def close(self):
+        for name in list(self._references):
+            self._references[name] = 1
+            self.release(name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @classmethod
+    def attach(cls, name):
+        """Return a view of a published array, and the block to close after use."""
+        # Workers started by `multiprocessing` share the resource tracker of their
+        # parent, which stays responsible for the block.
+        if sys.version_info >= (3, 13):
+            segment = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            segment = shared_memory.SharedMemory(name=name)
+        header = bytes(segment.buf[: cls.HEADER]).rstrip(b"\0")
+        header = ast.literal_eval(header.decode())
+        dtype = np.lib.format.descr_to_dtype(header["descr"])
+        array = np.ndarray(header["shape"], dtype, segment.buf, offset=cls.HEADER)
+        return array, segment
+
+
+def shared_sum(name, axis):
+    array, segment = SharedArrays.attach(name)
+    try:
+        return array.sum(axis=axis)
+    finally:
+        del array
+        segment.close()
+
+
+@register("Sharing arrays between processes", needs=[more_operations])
+def sharing_between_processes():
+    # The workers only get the name of the block. Since the sections only run when this
+    # script is run directly, workers that import it, as they do on Windows, don't run
+    # them again.
+    with SharedArrays() as shared_0:
+        name_0 = shared_0.publish("a_13", a_13)
+        with futures.ProcessPoolExecutor(2) as pool:
+            for result in pool.map(shared_sum, [name_0] * 3, [None, 0, 1]):
+                print(result)
+    # 4.8595784
+    # [1.12378257 1.04875507 1.01034462 1.67669614]
+    # [1.51832856 1.55434556 1.78690428]
+
+    # Structured arrays keep their fields.
+    with SharedArrays() as shared_1:
+        records_0 = np.array(
+            [(1, 2.5), (2, 4.0)], dtype=[("id", "i4"), ("score", "f8")]
+        )
+        array_0, segment_0 = SharedArrays.attach(shared_1.publish("records", records_0))
+        print(array_0.dtype.names, array_0["score"])  # ('id', 'score') [2.5 4. ]
+        del array_0
+        segment_0.close()
+        try:
+            shared_1.publish("objects", np.array(["x", 1], dtype=object))
+        except TypeError as error:
+            print(error)  # can't share arrays of Python objects between processes
+
+
+########################################################################################
+# Storing mostly-zero matrices compactly                                               #
+########################################################################################
+
+# A matrix created with `np.zeros()` and then filled in only a few places stores every
+# zero explicitly. If almost all entries are zero, you can instead store only the
+# nonzero entries: their values, their column indices, and for every row the position
+# in those arrays where the row begins (the "compressed sparse row" format).
+#
+# Reductions then only need to look at the stored values, plus one implicit zero for
+# every row or column that isn't completely filled.
+
+
+class SparseMatrix:
+    """A 2D matrix in compressed sparse row (CSR) format."""
+
+    def __init__(self, shape, indptr, indices, data):
+        self.shape = shape
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @classmethod
+    def from_coordinates(cls, shape, rows, cols, values):
+        order = np.lexsort((cols, rows))
+        counts = np.bincount(rows, minlength=shape[0])
+        indptr = np.concatenate(([0], np.cumsum(counts)))
+        return cls(shape, indptr, cols[order], values[order])
+
+    @classmethod
+    def from_nonzero(cls, a, coordinates=None):
+        """Store the entries of `a` at `coordinates`, by default its nonzero ones."""
+        rows, cols = np.nonzero(a) if coordinates is None else coordinates
+        return cls.from_coordinates(a.shape, rows, cols, a[rows, cols])
+
+    @classmethod
+    def from_mask(cls, a, mask):
+        return cls.from_nonzero(a, np.nonzero(mask))
+
+    @property
+    def rows(self):
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+    def to_dense(self):
+        dense = np.zeros(self.shape, dtype=self.data.dtype)
+        dense[self.rows, self.indices] = self.data
+        return dense
+
+    def _reduce(self, ufunc, axis):
+        # The result gets the data type NumPy would give it for the dense matrix, so
+        # that, for example, booleans and small integers are summed as 64-bit integers.
+        dtype = ufunc.reduce(np.zeros(1, dtype=self.data.dtype)).dtype
+        data = self.data.astype(dtype, copy=False)
+        if axis is not None:
+            axis = np.lib.array_utils.normalize_axis_index(axis, 2)
+        # Without any entries, NumPy gives the exact result (or error).
+        if math.prod(self.shape) == 0:
+            return ufunc.reduce(np.zeros(self.shape, dtype=dtype), axis=axis)
+        if axis is None:
+            result = ufunc.reduce(data) if len(data) else dtype.type(0)
+            if len(data) < math.prod(self.shape):
+                result = ufunc(result, dtype.type(0))
+            return result
+        groups = self.indices if axis == 0 else self.rows
+        length, full = (self.shape[1], self.shape[0]) if axis == 0 else self.shape
+        counts = np.bincount(groups, minlength=length)
+        order = np.argsort(groups, kind="stable")
+        starts = np.cumsum(counts) - counts
+        stored = counts > 0
+        result = np.zeros(length, dtype=dtype)
+        result[stored] = ufunc.reduceat(data[order], starts[stored])
+        partial = stored & (counts < full)
+        result[partial] = ufunc(result[partial], dtype.type(0))
+        return result
+
+    def sum(self, axis=None):
+        return self._reduce(np.add, axis)
+
+    def min(self, axis=None):
+        return self._reduce(np.minimum, axis)
+
+    def max(self, axis=None):
+        return self._reduce(np.maximum, axis)
+
+    def __add__(self, other):
+        # Adding a dense row or column fills in the zeros, so the result is dense.
+        dense = np.zeros(self.shape, dtype=self.data.dtype) + other
+        dense[self.rows, self.indices] += self.data
+        return dense
+
+    def __mul__(self, other):
+        # Multiplying keeps the zeros, so only the stored values change.
+        factors = np.broadcast_to(other, self.shape)[self.rows, self.indices]
+        return SparseMatrix(self.shape, self.indptr, self.indices, self.data * factors)
+
+    __radd__ = __add__
+    __rmul__ = __mul__
+
+    # Without this, an ndarray on the left of `+` or `*` would treat the matrix as a
+    # single object and apply the operator to it once per element. This makes NumPy
+    # return `NotImplemented`, so Python calls `__radd__()` or `__rmul__()` instead.
+    __array_ufunc__ = None
+
+
+@register(
+    "Storing mostly-zero matrices compactly",
+    needs=[indexing_and_slicing, creating_matrices],
+)
+def sparse_matrices():
+    a_20 = np.zeros((3, 2))
+    a_20[0, 1] = 5
+    a_20[2, 0] = -3
+    sparse_0 = SparseMatrix.from_nonzero(a_20)
+    print(sparse_0.data, sparse_0.indices, sparse_0.indptr)  # [ 5. -3.] [1 0] [0 1 1 2]
+    print(sparse_0.sum(), sparse_0.sum(axis=0), sparse_0.sum(axis=1))
+    # 2.0 [-3.  5.] [ 5.  0. -3.]
+    print(sparse_0.min(axis=0), sparse_0.max(axis=1))  # [-3.  0.] [5. 0. 0.]
+    print(sparse_0 + ones_row)
+    # [[ 1.  6.]
+    #  [ 1.  1.]
+    #  [-2.  1.]]
+    print((sparse_0 * np.array([2, 10])).to_dense())
+    # [[ 0. 50.]
+    #  [ 0.  0.]
+    #  [-6.  0.]]
+
+    # The dense operand can also come first.
+    print(np.array_equal(ones_row + sparse_0, sparse_0 + ones_row))  # True
+    print((np.array([2, 10]) * sparse_0).data)  # [50. -6.]
+
+    # You can also store just the entries selected by a boolean mask.
+    sparse_1 = SparseMatrix.from_mask(a_7, a_7 > 10)
+    print(sparse_1.data, sparse_1.max(axis=1))  # [11 12] [ 0  0 12]
+
+    # The results have the same data types as for the dense matrix, and negative axes
+    # count from the end.
+    sparse_2 = SparseMatrix.from_nonzero(np.array([[True, False], [True, False]]))
+    print(sparse_2.sum(axis=0), sparse_2.sum(axis=-1))  # [2 0] [1 1]
+
+
+########################################################################################
+# Running the sections                                                                 #
+########################################################################################
+
+
+def run(names=None, pandas=True):
+    """Run the named sections (by default all of them) and the sections they need.
+
+    With `pandas=False`, the sections that use Pandas, or need one that does, are
+    skipped.
+    """
+    selected = set()
+
+    def select(name):
+        if name not in selected:
+            selected.add(name)
+            for need in SECTIONS[name][2]:
+                select(need.__name__)
+
+    for name in SECTIONS if names is None else names:
+        select(name)
+    # The sections a section needs are always registered before it.
+    runnable = {}
+    for name, (_, _, needs, uses_pandas) in SECTIONS.items():
+        runnable[name] = (pandas or not uses_pandas) and all(
+            runnable[need.__name__] for need in needs
+        )
+
+    print("NumPy: the absolute basics for beginners")
+    for name, (title, func, _, _) in SECTIONS.items():
+        if name in selected and runnable[name]:
+            section(title)
+            func()
+
+
+def import_times(argv, n=15):
+    """Run the script again under `python -X importtime`, and list its slowest imports.
+
+    Only the imports made by the script itself are listed, each with the time it took
+    including the modules it imported in turn.
+    """
+    command = [sys.executable, "-X", "importtime", __file__, *argv]
+    result = subprocess.run(command, stderr=subprocess.PIPE, text=True, check=True)
+    times = {}
+    headers = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            print(line, file=sys.stderr)
+            continue
+        _, cumulative, name = line.split("|")
+        # Helper processes, such as the resource tracker of `multiprocessing`, report
+        # their imports too, each after a header line of their own.
+        if not cumulative.strip().isdigit():
+            headers += 1
+        # Nested imports are indented by two more spaces per level.
+        elif headers == 1 and not name.startswith("  "):
+            times.setdefault(name.strip(), int(cumulative) / 1e3)
+    print(f"\nSlowest imports (of {len(times)})\n")
+    for name, milliseconds in sorted(times.items(), key=lambda t: -t[1])[:n]:
+        print(f"{milliseconds:8.1f} ms  {name}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "sections",
+        nargs="*",
+        metavar="SECTION",
+        help="the sections to run (see --list), by default all of them",
+    )
+    parser.add_argument("--list", action="store_true", help="list the sections")
+    parser.add_argument(
+        "--no-csv", action="store_true", help="skip the sections that use Pandas"
+    )
+    parser.add_argument(
+        "--import-times",
+        action="store_true",
+        help="run the sections, then list the slowest imports",
+    )
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.sections if name not in SECTIONS]
+    if unknown:
+        parser.error(f"unknown sections: {', '.join(unknown)} (see --list)")
+
+    if args.list:
+        for name, (title, *_) in SECTIONS.items():
+            print(f"{name:28} {title}")
+    elif args.import_times:
+        import_times([arg for arg in argv if arg != "--import-times"])
+    else:
+        run(args.sections or None, pandas=not args.no_csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Timing and memory spans for the sections of main.py
+
+Profiling is off unless the `PROFILE` environment variable names an output file:
+
+    PROFILE=spans.jsonl python main.py  # one JSON object per span
+    PROFILE=trace.json python main.py   # a Chrome trace, for chrome://tracing
+
+When it's off, `span()` returns a context manager that does nothing.
+
+Counting the bytes allocated by NumPy takes a snapshot of all traced memory at the
+start and end of every span, which is slow once many objects exist, so it is only done
+if `PROFILE_NUMPY=1` is set as well.
+"""
+
+import atexit
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+PROFILE = os.environ.get("PROFILE")
+PROFILE_NUMPY = os.environ.get("PROFILE_NUMPY") == "1"
+
+_NUMPY_DATA = [tracemalloc.DomainFilter(True, np.lib.tracemalloc_domain)]
+_DISABLED = contextlib.nullcontext()
+_stack = []
+_events = []
+_section = None
+
+
+class _Span:
+    def __init__(self, name):
+        self.name = name
+        self.peak = 0
+
+    def __enter__(self):
+        # `tracemalloc` has a single peak, so the peak of the enclosing span is saved
+        # before it is reset for this one.
+        if _stack:
+            _stack[-1].peak = max(_stack[-1].peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        _stack.append(self)
+        self._numpy = _numpy_bytes() if PROFILE_NUMPY else 0
+        self._cpu = time.process_time()
+        self._wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        _stack.pop()
+        if _stack:
+            _stack[-1].peak = max(_stack[-1].peak, self.peak)
+        event = {
+            "name": self.name,
+            "start": self._wall,
+            "wall": wall,
+            "cpu": cpu,
+            "peak_memory": self.peak,
+        }
+        if PROFILE_NUMPY:
+            # NumPy data allocated in the span and still alive at its end.
+            event["numpy_bytes"] = _numpy_bytes() - self._numpy
+        _record(event)
+
+
+def _numpy_bytes():
+    snapshot = tracemalloc.take_snapshot().filter_traces(_NUMPY_DATA)
+    return sum(trace.size for trace in snapshot.traces)
+
+
+def _record(event):
+    if PROFILE.endswith(".jsonl"):
+        with open(PROFILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event) + "\n")
+    else:
+        _events.append(event)
+
+
+def _finish():
+    section(None)
+    if PROFILE.endswith(".jsonl"):
+        return
+    trace = [
+        {
+            "name": event["name"],
+            "ph": "X",
+            "ts": event["start"] * 1e6,
+            "dur": event["wall"] * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": {k: v for k, v in event.items() if k not in ("name", "start")},
+        }
+        for event in _events
+    ]
+    with open(PROFILE, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": trace}, f)
+
+
+def span(name):
+    """Measure the block of a `with` statement as a span of the given name."""
+    return _Span(name) if PROFILE else _DISABLED
+
+
+def section(title):
+    """Print the title of a section, and end the span of the previous section."""
+    global _section  # pylint: disable=global-statement
+    if _section:
+        _section.__exit__(None, None, None)
+        _section = None
+    if title is None:
+        return
+    print(f"\n{title}\n")
+    if PROFILE:
+        _section = span(title).__enter__()
+
+
+if PROFILE:
+    if os.path.exists(PROFILE):
+        os.remove(PROFILE)
+    tracemalloc.start()
+    atexit.register(_finish)